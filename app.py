@@ -1,23 +1,44 @@
 import os
 import smtplib
 import logging
-import uuid
 import base64
-import qrcode
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, make_response
+from email.mime.base import MIMEBase
+from email import encoders
+import click
+from flask import Flask, send_file, abort, render_template, request, redirect, url_for, flash, jsonify, Response, make_response, session, g, has_request_context
 from urllib.parse import quote as url_quote
 from io import BytesIO
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 import json
+import hashlib
+import time
+import threading
+import shutil
+import socket
+from collections import Counter
+from cache import SharedCache
+from telemetry import Telemetry
+from pix import PixImageStore, build_payload, cache_info as pix_cache_info
+from pdf_cache import PdfCache
+from pdf_render import HostSlots, RenderPool, render_to_cache, render_unordered
+from zip_stream import ZipStream
+from outbox import OutboxWorker
+from images import ImageVariants, is_variant
+from uploads import hash_to_temp, is_content_addressed, publish
+from smtp_pool import SmtpPool
+import sqlite_profile
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -31,6 +52,19 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+# SQLite installs (the default URI): WAL, synchronous=NORMAL and connection PRAGMAs on connect, small QueuePool
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'true').lower() == 'true'
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 5))
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16 * 1024))
+USE_SQLITE_PROFILE = app.config['SQLITE_PROFILE'] and sqlite_profile.is_sqlite(app.config['SQLALCHEMY_DATABASE_URI'])
+if USE_SQLITE_PROFILE:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_profile.engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=app.config['SQLITE_POOL_SIZE'],
+        busy_timeout_ms=app.config['SQLITE_BUSY_TIMEOUT_MS'],
+    )
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Email configuration
@@ -40,6 +74,81 @@ app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == '
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@emunah.com')
+# Authenticated SMTP sessions kept open per process and reused across messages
+app.config['MAIL_POOL_SIZE'] = int(os.environ.get('MAIL_POOL_SIZE', 2))
+app.config['MAIL_IDLE_TIMEOUT'] = int(os.environ.get('MAIL_IDLE_TIMEOUT', 60))
+# Outbound email is queued in email_outbox and delivered by a background sender thread
+app.config['EMAIL_OUTBOX_WORKER'] = os.environ.get('EMAIL_OUTBOX_WORKER', 'true').lower() == 'true'
+app.config['EMAIL_OUTBOX_POLL_SECONDS'] = int(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', 10))
+app.config['EMAIL_MAX_ATTEMPTS'] = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 6))
+app.config['EMAIL_RETRY_BASE_SECONDS'] = int(os.environ.get('EMAIL_RETRY_BASE_SECONDS', 30))
+app.config['EMAIL_SEND_TIMEOUT'] = int(os.environ.get('EMAIL_SEND_TIMEOUT', 300))
+
+# Shared cache (SQLite file visible to every Gunicorn worker on the host)
+app.config['CACHE_PATH'] = os.environ.get('CACHE_PATH', os.path.join(app.instance_path, 'cache.sqlite3'))
+app.config['METRICS_CACHE_TTL'] = int(os.environ.get('METRICS_CACHE_TTL', 60))
+app.config['LIST_PAGE_SIZE'] = int(os.environ.get('LIST_PAGE_SIZE', 50))
+# Strict mode for tests/dev: relationships a view did not eager-load raise instead of issuing one query each
+app.config['RAISE_ON_LAZY_LOAD'] = os.environ.get('RAISE_ON_LAZY_LOAD', 'false').lower() == 'true'
+# Per-request SQL instrumentation
+app.config['SQL_SLOWEST_COUNT'] = int(os.environ.get('SQL_SLOWEST_COUNT', 3))
+app.config['SQL_REPEAT_THRESHOLD'] = int(os.environ.get('SQL_REPEAT_THRESHOLD', 3))
+# Seconds a worker trusts its cached copy of the logged-in user (edits also invalidate it through the cache version)
+app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 30))
+shared_cache = SharedCache(app.config['CACHE_PATH'], default_ttl=app.config['METRICS_CACHE_TTL'])
+
+# Prometheus metrics, aggregated across workers through a local SQLite file
+app.config['TELEMETRY_PATH'] = os.environ.get('TELEMETRY_PATH', os.path.join(app.instance_path, 'telemetry.sqlite3'))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+telemetry = Telemetry(app.config['TELEMETRY_PATH'], flush_interval=int(os.environ.get('TELEMETRY_FLUSH_INTERVAL', 5)))
+telemetry.counter('emunah_http_requests_total', 'HTTP requests by endpoint, method and status')
+telemetry.histogram('emunah_http_request_duration_seconds', 'HTTP request latency by endpoint')
+telemetry.histogram('emunah_http_response_size_bytes', 'HTTP response body size by endpoint',
+                    buckets=(512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608))
+telemetry.gauge('emunah_db_pool_checked_out', 'Database connections currently checked out (sum of workers)')
+telemetry.gauge('emunah_db_pool_overflow', 'Database pool overflow connections in use (sum of workers)')
+telemetry.gauge('emunah_db_pool_size', 'Configured database pool size (sum of workers)')
+telemetry.histogram('emunah_pdf_render_duration_seconds', 'Quote PDF render time')
+telemetry.histogram('emunah_email_send_duration_seconds', 'SMTP delivery time by email type and outcome')
+telemetry.counter('emunah_emails_total', 'Emails by type and outcome (queued, sent, retried, failed, skipped)')
+
+# Rendered quote PDFs, keyed by a hash of their inputs
+app.config['PDF_CACHE_DIR'] = os.environ.get('PDF_CACHE_DIR', os.path.join(app.instance_path, 'pdf_cache'))
+app.config['PDF_CACHE_MAX_MB'] = int(os.environ.get('PDF_CACHE_MAX_MB', 200))
+pdf_cache = PdfCache(app.config['PDF_CACHE_DIR'], max_bytes=app.config['PDF_CACHE_MAX_MB'] * 1024 * 1024)
+telemetry.counter('emunah_pdf_cache_total', 'Quote PDF cache lookups by outcome (hit, miss)')
+
+# Off-request PDF rendering: bounded process pool per worker, jobs persisted in pdf_jobs
+app.config['PDF_RENDER_PROCESSES'] = int(os.environ.get('PDF_RENDER_PROCESSES', 1))
+app.config['PDF_JOB_TIMEOUT'] = int(os.environ.get('PDF_JOB_TIMEOUT', 300))
+app.config['PDF_JOB_QUEUE_LIMIT'] = int(os.environ.get('PDF_JOB_QUEUE_LIMIT', 20))
+# ZIP exports (web jobs in export_jobs and the export-quotes CLI) render on their own pool of
+# PDF_EXPORT_PROCESSES; web exports run in the background, PDF_EXPORT_CONCURRENCY at a time per host,
+# and their files are kept in PDF_EXPORT_DIR for PDF_EXPORT_KEEP_HOURS
+app.config['PDF_EXPORT_CONCURRENCY'] = int(os.environ.get('PDF_EXPORT_CONCURRENCY', 1))
+app.config['PDF_EXPORT_PROCESSES'] = int(os.environ.get('PDF_EXPORT_PROCESSES', os.cpu_count() or 2))
+app.config['PDF_EXPORT_DIR'] = os.environ.get('PDF_EXPORT_DIR', os.path.join(app.instance_path, 'exports'))
+app.config['PDF_EXPORT_TIMEOUT'] = int(os.environ.get('PDF_EXPORT_TIMEOUT', 3600))
+app.config['PDF_EXPORT_KEEP_HOURS'] = int(os.environ.get('PDF_EXPORT_KEEP_HOURS', 24))
+telemetry.counter('emunah_pdf_jobs_total', 'Background PDF jobs by action and outcome (done, failed)')
+
+
+# Resolved once: the shared stylesheet and the logo every quote PDF embeds
+PDF_STYLESHEET = os.path.join(app.root_path, 'static', 'css', 'quote_pdf.css')
+PDF_LOGO_PATH = os.path.join(app.root_path, 'static', 'images', 'logo_emunah.png')
+if not os.path.exists(PDF_LOGO_PATH):
+    PDF_LOGO_PATH = os.path.join(app.root_path, 'static', 'images', 'logo.png')
+# .reference-image-section img in quote_pdf.css: A4 minus 2 cm side margins, max-height 250px; at 300 dpi
+PDF_IMAGE_DPI = 300
+PDF_IMAGE_BOX = (round((21 - 2 * 2) / 2.54 * PDF_IMAGE_DPI), round(250 / 96 * PDF_IMAGE_DPI))
+PDF_RENDERER_ARGS = (app.root_path, PDF_STYLESHEET, (PDF_LOGO_PATH,))
+render_pool = RenderPool(app.config['PDF_RENDER_PROCESSES'], PDF_RENDERER_ARGS)
+export_slots = HostSlots(os.path.join(app.instance_path, 'export_slots'), app.config['PDF_EXPORT_CONCURRENCY'])
+
+# PIX QR images, generated once per payload and served from /pix/<hash>.<png|svg>
+app.config['PIX_CACHE_DIR'] = os.environ.get('PIX_CACHE_DIR', os.path.join(app.instance_path, 'pix_cache'))
+app.config['PIX_DEFAULT_KEY'] = os.environ.get('PIX_DEFAULT_KEY', '11998896725')
+pix_store = PixImageStore(app.config['PIX_CACHE_DIR'])
 
 # Upload configuration
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'quotes')
@@ -53,123 +162,70 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 PRINTS_UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'prints')
 os.makedirs(PRINTS_UPLOAD_FOLDER, exist_ok=True)
+# Thumbnail/medium WebP and JPEG copies written next to each upload, plus the print-size JPEG quote PDFs embed
+image_variants = ImageVariants(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+pdf_image_variants = ImageVariants(
+    image_variants.static_root,
+    variants=(('pdf', PDF_IMAGE_BOX),),
+    formats=(('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'dpi': (PDF_IMAGE_DPI, PDF_IMAGE_DPI)}),),
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_print_image(file, print_id):
+def _save_upload(file, folder, variant_sets):
+    """Store an uploaded image under its content hash and count one more reference to it"""
+    if not (file and allowed_file(file.filename)):
+        return None
+    ext = secure_filename(file.filename).rsplit('.', 1)[1].lower()
+    directory = os.path.join(image_variants.static_root, 'uploads', folder)
+    tmp_path, digest, size = hash_to_temp(file.stream, directory)
+    try:
+        image_path = f"uploads/{folder}/{digest}.{ext}"
+        full_path = os.path.join(image_variants.static_root, image_path)
+        publish(tmp_path, full_path)
+        for variants in variant_sets:
+            variants.generate_quietly(image_path)
+        acquire_upload(image_path, size)
+        # A release of the same content may have removed the file between publish and acquire;
+        # now that this transaction holds a reference, put it back
+        if not os.path.exists(full_path):
+            publish(tmp_path, full_path)
+            for variants in variant_sets:
+                variants.generate_quietly(image_path)
+    finally:
+        os.remove(tmp_path)
+    return image_path
+
+def save_print_image(file):
     """Save uploaded image for a print and return the relative path"""
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        ext = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"print_{print_id}_{uuid.uuid4().hex[:8]}.{ext}"
-        filepath = os.path.join(PRINTS_UPLOAD_FOLDER, unique_filename)
-        file.save(filepath)
-        return f"uploads/prints/{unique_filename}"
-    return None
+    return _save_upload(file, 'prints', (image_variants,))
 
 def delete_print_image(image_path):
-    """Delete a print image file"""
+    """Release a print image; the file is deleted after commit once nothing uses it"""
     if image_path and image_path.startswith('uploads/prints/'):
-        full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', image_path)
-        if os.path.exists(full_path):
-            os.remove(full_path)
+        release_upload(image_path)
 
-def save_quote_image(file, quote_id):
+def save_quote_image(file):
     """Save uploaded image for a quote and return the relative path"""
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        ext = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"quote_{quote_id}_{uuid.uuid4().hex[:8]}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
-        return f"uploads/quotes/{unique_filename}"
-    return None
+    return _save_upload(file, 'quotes', (image_variants, pdf_image_variants))
 
 def delete_quote_image(image_path):
-    """Delete a quote image file"""
+    """Release a quote image; the file is deleted after commit once nothing uses it"""
     if image_path:
-        full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', image_path)
-        if os.path.exists(full_path):
-            os.remove(full_path)
-
-
-def generate_pix_qrcode(pix_key, amount=None, name="Emunah", city="Sao Paulo", description=""):
-    """Generate PIX QR Code as base64 string"""
-    def crc16_ccitt(data):
-        crc = 0xFFFF
-        for byte in data.encode('utf-8'):
-            crc ^= byte << 8
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc <<= 1
-                crc &= 0xFFFF
-        return format(crc, '04X')
-    
-    def format_emv(id_code, value):
-        return f"{id_code}{len(value):02d}{value}"
-    
-    pix_key_clean = ''.join(filter(str.isdigit, pix_key)) if pix_key.replace('+', '').isdigit() else pix_key
-    
-    gui = format_emv("00", "BR.GOV.BCB.PIX")
-    chave = format_emv("01", pix_key_clean)
-    if description:
-        desc_clean = description[:25].replace(" ", "")
-        desc_field = format_emv("02", desc_clean)
-        merchant_account = format_emv("26", gui + chave + desc_field)
-    else:
-        merchant_account = format_emv("26", gui + chave)
-    
-    payload_format = format_emv("00", "01")
-    merchant_category = format_emv("52", "0000")
-    currency = format_emv("53", "986")
-    
-    amount_field = ""
-    if amount and float(amount) > 0:
-        amount_str = f"{float(amount):.2f}"
-        amount_field = format_emv("54", amount_str)
-    
-    country = format_emv("58", "BR")
-    
-    name_clean = name[:25].upper()
-    for char in ['Á', 'À', 'Ã', 'Â', 'É', 'È', 'Ê', 'Í', 'Ì', 'Î', 'Ó', 'Ò', 'Õ', 'Ô', 'Ú', 'Ù', 'Û', 'Ç']:
-        replacement = {'Á': 'A', 'À': 'A', 'Ã': 'A', 'Â': 'A', 'É': 'E', 'È': 'E', 'Ê': 'E', 
-                      'Í': 'I', 'Ì': 'I', 'Î': 'I', 'Ó': 'O', 'Ò': 'O', 'Õ': 'O', 'Ô': 'O',
-                      'Ú': 'U', 'Ù': 'U', 'Û': 'U', 'Ç': 'C'}.get(char, char)
-        name_clean = name_clean.replace(char, replacement)
-    merchant_name = format_emv("59", name_clean)
-    
-    city_clean = city[:15].upper()
-    for char in ['Á', 'À', 'Ã', 'Â', 'É', 'È', 'Ê', 'Í', 'Ì', 'Î', 'Ó', 'Ò', 'Õ', 'Ô', 'Ú', 'Ù', 'Û', 'Ç']:
-        replacement = {'Á': 'A', 'À': 'A', 'Ã': 'A', 'Â': 'A', 'É': 'E', 'È': 'E', 'Ê': 'E', 
-                      'Í': 'I', 'Ì': 'I', 'Î': 'I', 'Ó': 'O', 'Ò': 'O', 'Õ': 'O', 'Ô': 'O',
-                      'Ú': 'U', 'Ù': 'U', 'Û': 'U', 'Ç': 'C'}.get(char, char)
-        city_clean = city_clean.replace(char, replacement)
-    merchant_city = format_emv("60", city_clean)
-    
-    additional_data = format_emv("62", format_emv("05", "***"))
-    
-    payload_without_crc = payload_format + merchant_account + merchant_category + currency + amount_field + country + merchant_name + merchant_city + additional_data + "6304"
-    crc = crc16_ccitt(payload_without_crc)
-    payload = payload_without_crc + crc
-    
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
-    qr.add_data(payload)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="#520B1B", back_color="white")
-    
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    
-    return f"data:image/png;base64,{qr_base64}"
+        release_upload(image_path)
 
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+if USE_SQLITE_PROFILE:
+    with app.app_context():
+        sqlite_profile.install_pragmas(
+            db.engine,
+            busy_timeout_ms=app.config['SQLITE_BUSY_TIMEOUT_MS'],
+            mmap_size=app.config['SQLITE_MMAP_SIZE'],
+            cache_size_kb=app.config['SQLITE_CACHE_SIZE_KB'],
+        )
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
@@ -244,7 +300,7 @@ class Print(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    file_url = db.Column(db.String(500))
+    file_url = db.Column(db.String(500), index=True)  # indexed for the orphaned-upload sweep
     colors = db.Column(db.JSON, nullable=False)
     positions = db.Column(db.JSON, nullable=False)
     technique = db.Column(db.String(50), default='silk')
@@ -255,6 +311,11 @@ class Print(db.Model):
 
 class Quote(db.Model):
     __tablename__ = 'quotes'
+    __table_args__ = (
+        # Keyset pagination of the quotes list, with and without the status filter
+        db.Index('ix_quotes_created_at_id', 'created_at', 'id'),
+        db.Index('ix_quotes_status_created_at_id', 'status', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     quote_number = db.Column(db.String(50), unique=True)
     
@@ -266,7 +327,7 @@ class Quote(db.Model):
     lead_email = db.Column(db.String(255))
     lead_phone = db.Column(db.String(50))
     
-    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'))
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
     print_id = db.Column(db.Integer, db.ForeignKey('prints.id'))
@@ -300,7 +361,7 @@ class Quote(db.Model):
     
     # Image and reference URL
     reference_url = db.Column(db.String(500))  # External link/URL
-    image_path = db.Column(db.String(500))     # Path to uploaded image
+    image_path = db.Column(db.String(500), index=True)     # Path to uploaded image (indexed for the orphaned-upload sweep)
     
     # Timestamps
     notes = db.Column(db.Text)
@@ -333,6 +394,13 @@ class Quote(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Keyset pagination of the orders list, with and without the status filter
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+        # Delivered orders in a period (revenue by delivery date)
+        db.Index('ix_orders_status_delivered_at', 'status', 'delivered_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     quote_id = db.Column(db.Integer, db.ForeignKey('quotes.id'))
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=True)
@@ -387,7 +455,7 @@ class Order(db.Model):
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
     print_id = db.Column(db.Integer, db.ForeignKey('prints.id'))
     
@@ -406,6 +474,10 @@ class OrderItem(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # An order's transactions, optionally only the confirmed ones
+        db.Index('ix_transactions_order_id_status', 'order_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     payment_method = db.Column(db.String(50), nullable=False)
@@ -428,11 +500,445 @@ class EmailLog(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class EmailOutbox(db.Model):
+    """Email waiting to be delivered by the background sender; the outcome is recorded in email_logs"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(500))
+    html_body = db.Column(db.Text, nullable=False)
+    email_type = db.Column(db.String(50))
+    attachment_name = db.Column(db.String(255))
+    attachment = db.Column(db.LargeBinary)  # PDF bytes; cleared once delivered
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+class UploadBlob(db.Model):
+    """Reference count of a content-addressed upload (Quote.image_path / Print.file_url values)"""
+    __tablename__ = 'upload_blobs'
+    path = db.Column(db.String(500), primary_key=True)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DailyOrderStat(db.Model):
+    """Per-day, per-status rollup of orders, kept in sync by the flush hook below"""
+    __tablename__ = 'daily_order_stats'
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    
+    # Orders created on `day` that currently have `status`
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    total_value = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    paid_value = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    pending_value = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    # Orders delivered on `day` (only filled for status = 'delivered')
+    delivered_count = db.Column(db.Integer, nullable=False, default=0)
+    delivered_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class DocumentCounter(db.Model):
+    """Last number handed out per prefix (ORC, PED) and year; see allocate_document_number"""
+    __tablename__ = 'document_counters'
+    prefix = db.Column(db.String(10), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PdfJob(db.Model):
+    """Quote PDF rendered outside the request; the bytes live in the PDF cache under cache_key"""
+    __tablename__ = 'pdf_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    quote_id = db.Column(db.Integer, db.ForeignKey('quotes.id', ondelete='CASCADE'), nullable=False)
+    cache_key = db.Column(db.String(64), nullable=False, index=True)
+    action = db.Column(db.String(20), nullable=False, default='download')  # download, email
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    error_message = db.Column(db.Text)
+    worker_pid = db.Column(db.Integer)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    quote = db.relationship('Quote')
+
+
+class ExportJob(db.Model):
+    """ZIP of quote PDFs built outside the request; the file lives in PDF_EXPORT_DIR until it expires"""
+    __tablename__ = 'export_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    quote_ids = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed, expired
+    error_message = db.Column(db.Text)
+    worker_pid = db.Column(db.Integer)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+# ==================== ORDER ROLLUP ====================
+
+ROLLUP_COLUMNS = ['orders_count', 'total_value', 'paid_value', 'pending_value', 'delivered_count', 'delivered_revenue']
+
+
+def _money(value):
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+def _order_contribution(values):
+    """Map an order snapshot to the rollup rows it adds to: {(day, status): {column: delta}}"""
+    contribution = {}
+    if values is None or values['created_at'] is None:
+        return contribution
+    status = values['status'] or 'created'
+    total = _money(values['total_value'])
+    paid = _money(values['paid_value'])
+    contribution[(values['created_at'].date(), status)] = {
+        'orders_count': 1,
+        'total_value': total,
+        'paid_value': paid,
+        'pending_value': total - paid,
+    }
+    if status == 'delivered' and values['delivered_at'] is not None:
+        row = contribution.setdefault((values['delivered_at'].date(), status), {})
+        row['delivered_count'] = 1
+        row['delivered_revenue'] = total
+    return contribution
+
+
+def _order_snapshot(order, committed):
+    """Read the rollup-relevant fields of an order, either as last flushed or as about to be flushed"""
+    state = db.inspect(order)
+    values = {}
+    for key in ('status', 'total_value', 'paid_value', 'created_at', 'delivered_at'):
+        history = state.attrs[key].load_history()
+        if committed:
+            values[key] = (history.deleted or history.unchanged or [None])[0]
+        else:
+            values[key] = (history.added or history.unchanged or [None])[0]
+    return values
+
+
+def _apply_rollup_deltas(connection, deltas):
+    """Atomically add deltas to daily_order_stats rows, inserting missing rows"""
+    table = DailyOrderStat.__table__
+    dialect = connection.dialect.name
+    for (day, status), row in deltas.items():
+        values = {column: row.get(column, 0) for column in ROLLUP_COLUMNS}
+        if not any(values.values()):
+            continue
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(day=day, status=status, **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['day', 'status'],
+                set_={column: table.c[column] + stmt.excluded[column] for column in ROLLUP_COLUMNS}
+            )
+            connection.execute(stmt)
+        else:
+            result = connection.execute(
+                table.update()
+                .where(table.c.day == day, table.c.status == status)
+                .values({column: table.c[column] + values[column] for column in ROLLUP_COLUMNS})
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(day=day, status=status, **values))
+
+
+@event.listens_for(db.session, 'after_flush')
+def update_daily_order_stats(session, flush_context):
+    """Keep daily_order_stats in step with every order insert/update/delete, in the same transaction"""
+    deltas = {}
+    
+    def add(contribution, sign):
+        for key, row in contribution.items():
+            target = deltas.setdefault(key, {})
+            for column, value in row.items():
+                target[column] = target.get(column, 0) + sign * value
+    
+    for obj in session.new:
+        if isinstance(obj, Order):
+            add(_order_contribution(_order_snapshot(obj, committed=False)), 1)
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj, include_collections=False):
+            add(_order_contribution(_order_snapshot(obj, committed=True)), -1)
+            add(_order_contribution(_order_snapshot(obj, committed=False)), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            add(_order_contribution(_order_snapshot(obj, committed=True)), -1)
+    
+    if deltas:
+        _apply_rollup_deltas(session.connection(), deltas)
+
+
+# ==================== CACHE INVALIDATION ====================
+
+METRICS_MODELS = (Order, Quote, Client, Supplier, Product)
+UNVERSIONED_MODELS = (EmailLog, EmailOutbox, DailyOrderStat, PdfJob, ExportJob)
+
+
+@event.listens_for(db.session, 'after_flush')
+def flag_data_changes(session, flush_context):
+    """Remember which cache namespaces this transaction invalidates"""
+    changed = session.info.setdefault('changed_namespaces', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, UNVERSIONED_MODELS):
+            continue
+        changed.add('data')
+        if isinstance(obj, METRICS_MODELS):
+            changed.add('metrics')
+        elif isinstance(obj, User):
+            changed.add('users')
+
+
+@event.listens_for(db.session, 'after_commit')
+def bump_data_versions(session):
+    """Invalidate cached metrics and validators in every worker once the write is visible"""
+    for namespace in session.info.pop('changed_namespaces', ()):
+        try:
+            shared_cache.bump(namespace)
+        except Exception as e:
+            logging.error(f"Failed to invalidate {namespace} cache: {e}")
+
+
+@event.listens_for(db.session, 'after_rollback')
+def clear_data_changes(session):
+    session.info.pop('changed_namespaces', None)
+
+
+# ==================== UPLOAD STORAGE ====================
+
+def acquire_upload(image_path, size):
+    """Count one more reference to a stored upload, in the caller's transaction"""
+    table = UploadBlob.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(path=image_path, refcount=1, size=size, created_at=datetime.utcnow())
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['path'], set_={'refcount': table.c.refcount + 1}
+        ))
+    else:
+        result = db.session.execute(
+            table.update().where(table.c.path == image_path).values(refcount=table.c.refcount + 1)
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(path=image_path, refcount=1, size=size, created_at=datetime.utcnow()))
+
+
+def release_upload(image_path):
+    """Drop one reference, in the caller's transaction; remove_unused_uploads deletes the file after commit"""
+    table = UploadBlob.__table__
+    db.session.execute(
+        table.update().where(table.c.path == image_path).values(refcount=table.c.refcount - 1)
+    )
+    db.session.info.setdefault('released_uploads', set()).add(image_path)
+
+
+def delete_upload_files(image_path):
+    full_path = os.path.join(image_variants.static_root, image_path)
+    if os.path.exists(full_path):
+        os.remove(full_path)
+    image_variants.delete(image_path)
+    pdf_image_variants.delete(image_path)
+
+
+def remove_upload_if_unused(image_path):
+    """Delete the file once its count reaches zero; the row is deleted first, so a concurrent
+    upload of the same content waits for this transaction and then writes the file again"""
+    table = UploadBlob.__table__
+    with db.engine.begin() as connection:
+        refcount = connection.execute(db.select(table.c.refcount).where(table.c.path == image_path)).scalar()
+        if refcount is not None:
+            deleted = connection.execute(table.delete().where(table.c.path == image_path, table.c.refcount <= 0))
+            if deleted.rowcount == 0:
+                return False
+        # (no row: a file from before content addressing, used by this record only)
+        delete_upload_files(image_path)
+    return True
+
+
+@event.listens_for(db.session, 'after_commit')
+def remove_unused_uploads(session):
+    for image_path in session.info.pop('released_uploads', ()):
+        try:
+            remove_upload_if_unused(image_path)
+        except Exception as e:
+            logging.error(f"Failed to remove upload {image_path}: {e}")
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_released_uploads(session):
+    session.info.pop('released_uploads', None)
+
+
+def _iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _old_upload_files(folder, cutoff, variants):
+    """Stream (rel_path, entry) for files in static/uploads/<folder> last modified before cutoff;
+    originals when variants is False, variant and leftover temp files when True"""
+    directory = os.path.join(image_variants.static_root, 'uploads', folder)
+    if not os.path.isdir(directory):
+        return
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                continue
+            if (is_variant(entry.name) or entry.name.endswith('.tmp')) == variants:
+                yield f'uploads/{folder}/{entry.name}', entry
+
+
+def _referenced_paths(folder, paths):
+    column = Quote.image_path if folder == 'quotes' else Print.file_url
+    return {path for (path,) in db.session.query(column).filter(column.in_(paths))}
+
+
+def _has_original(rel_path):
+    """Whether the upload a variant was made from is still on disk"""
+    stem = os.path.join(image_variants.static_root, rel_path.split('@', 1)[0])
+    return any(os.path.exists(f'{stem}.{ext}') for ext in ALLOWED_EXTENSIONS)
+
+
+def sweep_orphaned_uploads(grace, quarantine_dir=None, dry_run=False, batch_size=500):
+    """Delete (or move to quarantine_dir) upload files older than `grace` that no quote or print uses.
+
+    Originals are checked in batches against Quote.image_path / Print.file_url; variants and
+    temp files go once their original is gone. Returns counts and bytes reclaimed per folder.
+    """
+    cutoff = time.time() - grace.total_seconds()
+    report = {}
+    removed_stems = set()  # originals disposed of in this sweep (still on disk in a dry run)
+    
+    def dispose(rel_path, entry, stats):
+        stats['orphans'] += 1
+        stats['bytes'] += entry.stat().st_size
+        if dry_run:
+            return
+        if quarantine_dir:
+            target = os.path.join(quarantine_dir, rel_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(entry.path, target)
+        else:
+            os.remove(entry.path)
+    
+    for folder in ('quotes', 'prints'):
+        stats = report[folder] = {'scanned': 0, 'orphans': 0, 'bytes': 0}
+        for batch in _iter_batches(_old_upload_files(folder, cutoff, variants=False), batch_size):
+            stats['scanned'] += len(batch)
+            referenced = _referenced_paths(folder, [rel_path for rel_path, _ in batch])
+            orphans = [(rel_path, entry) for rel_path, entry in batch if rel_path not in referenced]
+            for rel_path, entry in orphans:
+                dispose(rel_path, entry, stats)
+                removed_stems.add(rel_path.rsplit('.', 1)[0])
+            if orphans and not dry_run:
+                table = UploadBlob.__table__
+                db.session.execute(table.delete().where(table.c.path.in_([rel_path for rel_path, _ in orphans])))
+                db.session.commit()
+        for rel_path, entry in _old_upload_files(folder, cutoff, variants=True):
+            stats['scanned'] += 1
+            if entry.name.endswith('.tmp') or rel_path.split('@', 1)[0] in removed_stems \
+                    or not _has_original(rel_path):
+                dispose(rel_path, entry, stats)
+    return report
+
+
+@app.cli.command('gc-uploads')
+@click.option('--grace-hours', type=float, default=24, show_default=True, help='Only files older than this')
+@click.option('--delete', 'delete_files', is_flag=True, help='Delete orphans instead of quarantining them')
+@click.option('--quarantine-dir', help='Where orphans are moved (default: instance/upload_quarantine)')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Only report what would be reclaimed')
+def gc_uploads_command(grace_hours, delete_files, quarantine_dir, batch_size, dry_run):
+    """Remove uploaded files that no quote or print references"""
+    if not delete_files:
+        quarantine_dir = quarantine_dir or os.path.join(app.instance_path, 'upload_quarantine')
+    report = sweep_orphaned_uploads(timedelta(hours=grace_hours), quarantine_dir, dry_run, batch_size)
+    action = 'Would reclaim' if dry_run else ('Deleted' if delete_files else f'Quarantined in {quarantine_dir}')
+    for folder, stats in report.items():
+        print(f"uploads/{folder}: {stats['scanned']} files checked, {stats['orphans']} orphans, "
+              f"{stats['bytes'] / 1024 / 1024:.1f} MB")
+    print(f"{action}: {sum(s['orphans'] for s in report.values())} files, "
+          f"{sum(s['bytes'] for s in report.values()) / 1024 / 1024:.1f} MB")
+
+
+@app.after_request
+def cache_content_addressed_uploads(response):
+    """Uploads named by their content hash (and their variants) never change: let browsers keep them"""
+    if request.endpoint == 'static' and response.status_code in (200, 304) \
+            and is_content_addressed((request.view_args or {}).get('filename', '')):
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = 31536000
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+def rebuild_daily_order_stats():
+    """Recompute daily_order_stats from the orders table"""
+    deltas = {}
+    for values in db.session.query(
+        Order.status, Order.total_value, Order.paid_value, Order.created_at, Order.delivered_at
+    ).yield_per(1000):
+        for key, row in _order_contribution(values._asdict()).items():
+            target = deltas.setdefault(key, {})
+            for column, value in row.items():
+                target[column] = target.get(column, 0) + value
+    DailyOrderStat.query.delete()
+    _apply_rollup_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+@app.cli.command('rebuild-order-stats')
+def rebuild_order_stats_command():
+    """Rebuild the daily_order_stats rollup from scratch."""
+    rows = rebuild_daily_order_stats()
+    print(f'daily_order_stats rebuilt: {rows} rows')
+
+
 # ==================== EMAIL SERVICE ====================
 
-def send_email(to_email, subject, html_content, email_type='general'):
-    """Send email using SMTP configuration"""
-    if not app.config['MAIL_USERNAME'] or not app.config['MAIL_PASSWORD']:
+def record_email_telemetry(email_type, outcome, seconds):
+    labels = {'email_type': email_type, 'outcome': outcome}
+    telemetry.observe('emunah_email_send_duration_seconds', seconds, labels)
+    telemetry.inc('emunah_emails_total', labels)
+
+
+def mail_configured():
+    return bool(app.config['MAIL_USERNAME'] and app.config['MAIL_PASSWORD'])
+
+
+def send_email(to_email, subject, html_content, email_type='general', attachment=None, attachment_name=None):
+    """Queue an email in the outbox for the background sender. Returns False if email is not configured."""
+    if not mail_configured():
         logging.warning(f"Email not configured. Would send to {to_email}: {subject}")
         email_log = EmailLog(
             recipient=to_email,
@@ -443,46 +949,22 @@ def send_email(to_email, subject, html_content, email_type='general'):
         )
         db.session.add(email_log)
         db.session.commit()
+        telemetry.inc('emunah_emails_total', {'email_type': email_type, 'outcome': 'skipped'})
         return False
     
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = app.config['MAIL_DEFAULT_SENDER']
-        msg['To'] = to_email
-        
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
-        
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-        server.starttls()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        server.sendmail(app.config['MAIL_DEFAULT_SENDER'], to_email, msg.as_string())
-        server.quit()
-        
-        email_log = EmailLog(
-            recipient=to_email,
-            subject=subject,
-            email_type=email_type,
-            status='sent'
-        )
-        db.session.add(email_log)
-        db.session.commit()
-        
-        logging.info(f"Email sent successfully to {to_email}")
-        return True
-    except Exception as e:
-        logging.error(f"Failed to send email to {to_email}: {str(e)}")
-        email_log = EmailLog(
-            recipient=to_email,
-            subject=subject,
-            email_type=email_type,
-            status='failed',
-            error_message=str(e)
-        )
-        db.session.add(email_log)
-        db.session.commit()
-        return False
+    db.session.add(EmailOutbox(
+        recipient=to_email,
+        subject=subject,
+        html_body=html_content,
+        email_type=email_type,
+        attachment=attachment,
+        attachment_name=attachment_name,
+    ))
+    db.session.commit()
+    telemetry.inc('emunah_emails_total', {'email_type': email_type, 'outcome': 'queued'})
+    if app.config['EMAIL_OUTBOX_WORKER']:
+        email_worker.wake()
+    return True
 
 
 def send_quote_email(quote, to_client=True):
@@ -657,98 +1139,567 @@ def send_delivery_notification(order):
     return send_email(email, subject, html, 'delivery_notification')
 
 
+def send_quote_pdf_email(quote, pdf_data):
+    """Queue the rendered quote PDF for the client and mark the quote as sent"""
+    client_email = quote.get_client_email()
+    subject = f"Emunah - Orçamento #{quote.quote_number}"
+    
+    email_html = f"""
+    <html>
+    <body style="font-family: 'Inter', Arial, sans-serif; background-color: #F5EDE6; padding: 20px;">
+        <div style="max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px;">
+            <div style="text-align: center; margin-bottom: 20px;">
+                <h1 style="color: #520B1B; font-family: 'Playfair Display', serif;">Emunah</h1>
+                <p style="color: #666;">Vista-se com propósito</p>
+            </div>
+            <h2 style="color: #520B1B;">Orçamento #{quote.quote_number}</h2>
+            <p>Olá {quote.get_client_name()},</p>
+            <p>Segue em anexo o orçamento solicitado.</p>
+            <div style="background: #F5EDE6; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                <p><strong>Valor Total:</strong> R$ {quote.total_price or 0:.2f}</p>
+                <p><strong>Sinal ({quote.down_payment_percent}%):</strong> R$ {quote.down_payment_value or 0:.2f}</p>
+                <p><strong>Prazo:</strong> {quote.delivery_days or 15} dias úteis</p>
+            </div>
+            <p><strong>PIX para pagamento:</strong> {quote.pix_key}</p>
+            <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
+            <p style="font-style: italic; color: #520B1B; text-align: center;">
+                "Tudo posso naquele que me fortalece." - Filipenses 4:13
+            </p>
+            <p style="color: #666; font-size: 12px; text-align: center;">
+                Emunah - Vista-se com propósito<br>
+                Contato: (11) 99889-6725
+            </p>
+        </div>
+    </body>
+    </html>
+    """
+    
+    # Marked as sent on enqueue, like send_quote; delivery failures show up in email_logs
+    if not send_email(client_email, subject, email_html, 'quote_pdf',
+                      attachment=pdf_data, attachment_name=f"Orcamento_{quote.quote_number}.pdf"):
+        return False
+    quote.status = 'sent'
+    quote.sent_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+# ==================== EMAIL OUTBOX ====================
+
+EMAIL_BATCH_SIZE = 20
+EMAIL_MAX_RETRY_DELAY = 3600
+
+
+def build_email_message(message):
+    """MIME message for an outbox row: HTML body plus the optional PDF attachment"""
+    msg = MIMEMultipart('alternative') if message.attachment is None else MIMEMultipart()
+    msg['Subject'] = message.subject
+    msg['From'] = app.config['MAIL_DEFAULT_SENDER']
+    msg['To'] = message.recipient
+    msg.attach(MIMEText(message.html_body, 'html'))
+    
+    if message.attachment is not None:
+        pdf_attachment = MIMEBase('application', 'pdf')
+        pdf_attachment.set_payload(message.attachment)
+        encoders.encode_base64(pdf_attachment)
+        pdf_attachment.add_header('Content-Disposition', f'attachment; filename="{message.attachment_name}"')
+        msg.attach(pdf_attachment)
+    return msg
+
+
+def claim_outbox_messages(limit=EMAIL_BATCH_SIZE):
+    """Mark up to `limit` due messages as 'sending' for this process and return their ids"""
+    now = datetime.utcnow()
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    
+    # A sender that died mid-delivery leaves its rows in 'sending'; put them back in the queue
+    stale = now - timedelta(seconds=app.config['EMAIL_SEND_TIMEOUT'])
+    EmailOutbox.query.filter(
+        EmailOutbox.status == 'sending', EmailOutbox.locked_at < stale
+    ).update({'status': 'pending', 'locked_by': None, 'locked_at': None}, synchronize_session=False)
+    
+    due = db.session.query(EmailOutbox.id).filter(
+        EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(limit).all()
+    
+    claimed = []
+    for (message_id,) in due:
+        # Conditional update: when several workers poll at once, each row goes to exactly one
+        if EmailOutbox.query.filter_by(id=message_id, status='pending').update(
+            {'status': 'sending', 'locked_by': owner, 'locked_at': now}, synchronize_session=False
+        ):
+            claimed.append(message_id)
+    db.session.commit()
+    return claimed
+
+
+def record_delivery_failure(message, error):
+    """Schedule a retry with exponential backoff, or give up. Returns the telemetry outcome."""
+    message.attempts += 1
+    message.last_error = str(error) or error.__class__.__name__
+    message.locked_by = None
+    message.locked_at = None
+    
+    permanent = isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPAuthenticationError))
+    if not permanent and message.attempts < app.config['EMAIL_MAX_ATTEMPTS']:
+        delay = min(app.config['EMAIL_RETRY_BASE_SECONDS'] * 2 ** (message.attempts - 1), EMAIL_MAX_RETRY_DELAY)
+        message.status = 'pending'
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logging.warning(f"Email {message.id} to {message.recipient} failed (attempt {message.attempts}), retrying in {delay}s: {message.last_error}")
+        return 'retried'
+    
+    message.status = 'failed'
+    logging.error(f"Failed to send email {message.id} to {message.recipient}: {message.last_error}")
+    db.session.add(EmailLog(
+        recipient=message.recipient,
+        subject=message.subject,
+        email_type=message.email_type,
+        status='failed',
+        error_message=message.last_error
+    ))
+    return 'failed'
+
+
+def process_email_outbox(limit=EMAIL_BATCH_SIZE):
+    """Deliver due outbox messages. Returns the number of messages attempted."""
+    claimed = claim_outbox_messages(limit)
+    if not claimed:
+        return 0
+    messages = EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+    
+    def record_result(index, error, seconds):
+        # Committed before the next message goes out: a crash or timeout mid-batch leaves at most
+        # the message being sent in 'sending', not every delivered one waiting to be sent again
+        message = messages[index]
+        if error is not None:
+            outcome = record_delivery_failure(message, error)
+        else:
+            outcome = 'sent'
+            message.status = 'sent'
+            message.attempts += 1
+            message.sent_at = datetime.utcnow()
+            message.attachment = None
+            message.locked_by = None
+            message.locked_at = None
+            db.session.add(EmailLog(
+                recipient=message.recipient,
+                subject=message.subject,
+                email_type=message.email_type,
+                status='sent'
+            ))
+            logging.info(f"Email sent successfully to {message.recipient}")
+        db.session.commit()
+        record_email_telemetry(message.email_type, outcome, seconds)
+    
+    # The whole batch goes through one pooled session (e.g. client + supplier confirmations of an order)
+    smtp_pool.send_many(
+        ((app.config['MAIL_DEFAULT_SENDER'], message.recipient, build_email_message(message).as_string())
+         for message in messages),
+        on_result=record_result
+    )
+    return len(messages)
+
+
+def drain_email_outbox():
+    """OutboxWorker task: one batch per call; True asks for another batch right away"""
+    with app.app_context():
+        try:
+            full = process_email_outbox() == EMAIL_BATCH_SIZE
+        finally:
+            db.session.remove()
+    if not full:
+        smtp_pool.prune()
+    return full
+
+
+smtp_pool = SmtpPool(
+    app.config['MAIL_SERVER'], app.config['MAIL_PORT'],
+    username=app.config['MAIL_USERNAME'], password=app.config['MAIL_PASSWORD'],
+    use_tls=app.config['MAIL_USE_TLS'],
+    max_idle=app.config['MAIL_POOL_SIZE'], idle_timeout=app.config['MAIL_IDLE_TIMEOUT'],
+)
+email_worker = OutboxWorker(drain_email_outbox, interval=app.config['EMAIL_OUTBOX_POLL_SECONDS'])
+
+
+@app.cli.command('send-emails')
+@click.option('--loop', is_flag=True, help='Keep polling the outbox (run as a separate sender process)')
+def send_emails_command(loop):
+    """Deliver queued emails from email_outbox"""
+    while True:
+        attempted = process_email_outbox()
+        if attempted:
+            print(f"Processed {attempted} emails")
+        elif not loop:
+            break
+        else:
+            time.sleep(app.config['EMAIL_OUTBOX_POLL_SECONDS'])
+
+
 # ==================== USER LOADER ====================
 
+class UserIdentity(UserMixin):
+    """What requests need from the logged-in user, kept without an ORM instance or session"""
+
+    def __init__(self, id, name, role):
+        self.id = id
+        self.name = name
+        self.role = role
+
+
+# user id -> (identity, expires_at, 'users' version); per worker, checked against the shared version
+_identity_cache = {}
+
+
+def _users_version():
+    try:
+        return shared_cache.version('users')
+    except Exception as e:
+        logging.error(f"Failed to read users cache version: {e}")
+        return None
+
+
+def invalidate_user_identity(user_id):
+    _identity_cache.pop(user_id, None)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    version = _users_version()
+    entry = _identity_cache.get(user_id)
+    if entry is not None and entry[1] > time.monotonic() and entry[2] == version and version is not None:
+        return entry[0]
+    
+    user = db.session.get(User, user_id)
+    if user is None:
+        invalidate_user_identity(user_id)
+        return None
+    identity = UserIdentity(user.id, user.name, user.role)
+    _identity_cache[user_id] = (identity, time.monotonic() + app.config['IDENTITY_CACHE_TTL'], version)
+    return identity
 
 
-# ==================== HELPERS ====================
+# ==================== SQL INSTRUMENTATION ====================
 
-def get_dashboard_metrics():
-    from sqlalchemy import extract, func
-    
-    total_revenue = db.session.query(db.func.coalesce(db.func.sum(Order.total_value), 0)).filter(Order.status == 'delivered').scalar()
-    completed_orders = Order.query.filter_by(status='delivered').count()
-    pending_quotes = Quote.query.filter(Quote.status.in_(['draft', 'pending', 'sent'])).count()
-    avg_ticket = db.session.query(db.func.coalesce(db.func.avg(Order.total_value), 0)).filter(Order.status == 'delivered').scalar()
-    orders_in_production = Order.query.filter_by(status='production').count()
+sql_logger = logging.getLogger('emunah.sql')
+route_sql_stats = {}
+route_sql_stats_lock = threading.Lock()
+route_sql_stats_since = datetime.utcnow()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries.append((statement, elapsed))
+
+
+with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@app.before_request
+def start_sql_instrumentation():
+    g.request_started = time.perf_counter()
+    g.sql_queries = []
+
+
+@app.after_request
+def report_sql_instrumentation(response):
+    """Expose per-request SQL cost as Server-Timing, a structured log line and per-route aggregates"""
+    queries = g.pop('sql_queries', None)
+    if queries is None or request.endpoint in (None, 'static'):
+        return response
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    sql_ms = sum(elapsed for _, elapsed in queries) * 1000
+    repeated = {
+        statement: count
+        for statement, count in Counter(statement for statement, _ in queries).items()
+        if count >= app.config['SQL_REPEAT_THRESHOLD']
+    }
+    slowest = sorted(queries, key=lambda q: q[1], reverse=True)[:app.config['SQL_SLOWEST_COUNT']]
     
-    total_quotes = Quote.query.count()
-    total_orders = Order.query.count()
-    total_clients = Client.query.count()
-    total_suppliers = Supplier.query.count()
-    total_products = Product.query.filter_by(active=True).count()
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={sql_ms:.1f};desc="{len(queries)} queries", app;dur={total_ms:.1f}'
+    )
     
-    approved_quotes = Quote.query.filter(Quote.status.in_(['approved', 'converted'])).count()
-    conversion_rate = (approved_quotes / total_quotes * 100) if total_quotes > 0 else 0
+    sql_logger.info(json.dumps({
+        'event': 'request_sql',
+        'method': request.method,
+        'endpoint': request.endpoint,
+        'path': request.path,
+        'status': response.status_code,
+        'queries': len(queries),
+        'sql_ms': round(sql_ms, 2),
+        'total_ms': round(total_ms, 2),
+        'slowest': [{'ms': round(elapsed * 1000, 2), 'sql': ' '.join(statement.split())[:200]} for statement, elapsed in slowest],
+        'repeated': [{'count': count, 'sql': ' '.join(statement.split())[:200]} for statement, count in repeated.items()],
+    }, ensure_ascii=False))
+    if repeated:
+        sql_logger.warning(f"Possible N+1 in {request.endpoint}: "
+                           + '; '.join(f"{count}x {' '.join(statement.split())[:120]}" for statement, count in repeated.items()))
+    
+    with route_sql_stats_lock:
+        stats = route_sql_stats.setdefault(request.endpoint, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_ms': 0.0, 'total_ms': 0.0,
+            'max_total_ms': 0.0, 'n_plus_one': 0,
+        })
+        stats['requests'] += 1
+        stats['queries'] += len(queries)
+        stats['max_queries'] = max(stats['max_queries'], len(queries))
+        stats['sql_ms'] += sql_ms
+        stats['total_ms'] += total_ms
+        stats['max_total_ms'] = max(stats['max_total_ms'], total_ms)
+        stats['n_plus_one'] += 1 if repeated else 0
+    return response
+
+
+@app.after_request
+def record_request_telemetry(response):
+    """Feed request count, latency, response size and pool gauges into the Prometheus metrics"""
+    started = g.get('request_started')
+    if started is None or request.endpoint == 'static':
+        return response
+    endpoint = request.endpoint or 'not_found'
+    telemetry.inc('emunah_http_requests_total', {
+        'endpoint': endpoint, 'method': request.method, 'status': response.status_code
+    })
+    telemetry.observe('emunah_http_request_duration_seconds', time.perf_counter() - started, {'endpoint': endpoint})
+    if response.content_length is not None:
+        telemetry.observe('emunah_http_response_size_bytes', response.content_length, {'endpoint': endpoint})
+    record_pool_gauges()
+    try:
+        telemetry.maybe_flush()
+    except Exception as e:
+        logging.warning(f"Telemetry flush failed: {e}")
+    return response
+
+
+def record_pool_gauges():
+    pool = db.engine.pool
+    for name, attribute in (('emunah_db_pool_checked_out', 'checkedout'),
+                            ('emunah_db_pool_overflow', 'overflow'),
+                            ('emunah_db_pool_size', 'size')):
+        if hasattr(pool, attribute):
+            telemetry.set_gauge(name, max(getattr(pool, attribute)(), 0))
+
+
+# ==================== HELPERS ====================
+
+ORDER_STATUSES = ['created', 'production', 'ready', 'shipping', 'delivered', 'cancelled']
+QUOTE_STATUSES = ['draft', 'sent', 'approved', 'converted', 'rejected']
+
+
+def _aggregate_by_status(model, *columns):
+    """Run one GROUP BY status query and return {status: row} for the given aggregate columns"""
+    rows = db.session.query(model.status, *columns).group_by(model.status).all()
+    return {row[0]: row for row in rows}
+
+
+def _sum_rows(rows, index):
+    """Sum one aggregate column across several status rows, ignoring NULLs"""
+    values = [row[index] for row in rows if row[index] is not None]
+    return sum(values) if values else 0
+
+
+ANALYTICS_BUCKETS = ('day', 'week', 'month')
+# Longest range one /api/analytics request may cover, per bucket
+ANALYTICS_MAX_DAYS = {'day': 366, 'week': 5 * 366, 'month': 5 * 366}
+# Bucket arithmetic steps up to a month past `to` and a week before `from`
+ANALYTICS_MIN_DATE = datetime.min.date() + timedelta(days=7)
+ANALYTICS_MAX_DATE = datetime.max.date() - timedelta(days=62)
+
+
+def _add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def _bucket_start(day, bucket):
+    """Python twin of date_bucket(): the first day of the bucket containing `day`"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def analytics_range_error(start, end, bucket):
+    """Why start..end cannot be served with this bucket, or None"""
+    if not (ANALYTICS_MIN_DATE <= start <= ANALYTICS_MAX_DATE and ANALYTICS_MIN_DATE <= end <= ANALYTICS_MAX_DATE):
+        return f'Datas devem estar entre {ANALYTICS_MIN_DATE.isoformat()} e {ANALYTICS_MAX_DATE.isoformat()}'
+    if start > end:
+        return 'from deve ser anterior a to'
+    if (end - start).days > ANALYTICS_MAX_DAYS[bucket]:
+        return f'Intervalo máximo para bucket={bucket}: {ANALYTICS_MAX_DAYS[bucket]} dias'
+    return None
+
+
+def _bucket_starts(start, end, bucket):
+    """Every bucket start between two dates, inclusive"""
+    current = _bucket_start(start, bucket)
+    starts = []
+    while current <= end:
+        starts.append(current)
+        if bucket == 'month':
+            current = _add_months(current, 1)
+        else:
+            current += timedelta(days=7 if bucket == 'week' else 1)
+    return starts
+
+
+def date_bucket(column, bucket):
+    """SQL expression truncating a date/datetime column to the start of its day, ISO week or month"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.cast(db.func.date_trunc(bucket, column), db.Date)
+    if bucket == 'week':
+        return db.func.date(column, 'weekday 0', '-6 days')
+    if bucket == 'month':
+        return db.func.date(column, 'start of month')
+    return db.func.date(column)
+
+
+def _bucket_key(value):
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def get_analytics(start, end, bucket='month'):
+    """Orders, delivered revenue, quotes and conversion per bucket for the days start..end (inclusive).
     
-    pending_orders = Order.query.filter(Order.status.in_(['created', 'production', 'ready'])).count()
-    shipped_orders = Order.query.filter_by(status='shipping').count()
+    Always two grouped queries - one over the daily rollup and one over quotes - however many buckets.
+    """
+    order_bucket = date_bucket(DailyOrderStat.day, bucket)
+    order_rows = db.session.query(
+        order_bucket,
+        db.func.sum(DailyOrderStat.orders_count),
+        db.func.sum(DailyOrderStat.delivered_revenue),
+    ).filter(
+        DailyOrderStat.day >= start,
+        DailyOrderStat.day <= end
+    ).group_by(order_bucket).all()
+    
+    quote_bucket = date_bucket(Quote.created_at, bucket)
+    quote_rows = db.session.query(
+        quote_bucket,
+        db.func.count(Quote.id),
+        db.func.sum(db.case((Quote.status.in_(['approved', 'converted']), 1), else_=0)),
+    ).filter(
+        Quote.created_at >= datetime.combine(start, datetime.min.time()),
+        Quote.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time())
+    ).group_by(quote_bucket).all()
+    
+    orders_by_bucket = {_bucket_key(key): (count, revenue) for key, count, revenue in order_rows}
+    quotes_by_bucket = {_bucket_key(key): (count, approved) for key, count, approved in quote_rows}
+    
+    series = []
+    for bucket_start in _bucket_starts(start, end, bucket):
+        key = bucket_start.isoformat()
+        order_count, revenue = orders_by_bucket.get(key, (0, 0))
+        quote_count, approved = quotes_by_bucket.get(key, (0, 0))
+        series.append({
+            'start': key,
+            'orders': int(order_count or 0),
+            'revenue': float(revenue) if revenue else 0,
+            'quotes': int(quote_count or 0),
+            'approved_quotes': int(approved or 0),
+            'conversion_rate': round(approved / quote_count * 100, 1) if quote_count else 0
+        })
+    return series
+
+
+def get_dashboard_metrics():
+    """Build the dashboard metrics dictionary from a handful of grouped aggregate queries.
     
+    Order figures come from the daily_order_stats rollup, so their cost does not grow with order history.
+    """
     today = datetime.utcnow()
     start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     start_of_week = today - timedelta(days=today.weekday())
     start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    revenue_this_month = db.session.query(db.func.coalesce(db.func.sum(Order.total_value), 0)).filter(
-        Order.status == 'delivered',
-        Order.delivered_at >= start_of_month
-    ).scalar()
+    def count_since(column, since):
+        return db.func.sum(db.case((column >= since, 1), else_=0))
+    
+    def sum_since(column, since, value):
+        return db.func.sum(db.case((column >= since, value), else_=0))
+    
+    # Orders: counts, money and period figures per status in one pass over the rollup
+    order_rows = _aggregate_by_status(
+        DailyOrderStat,
+        db.func.sum(DailyOrderStat.orders_count),
+        db.func.sum(DailyOrderStat.total_value),
+        db.func.sum(DailyOrderStat.delivered_count),
+        db.func.sum(DailyOrderStat.paid_value),
+        db.func.sum(DailyOrderStat.pending_value),
+        sum_since(DailyOrderStat.day, start_of_month.date(), DailyOrderStat.delivered_revenue),
+        sum_since(DailyOrderStat.day, start_of_month.date(), DailyOrderStat.orders_count),
+        sum_since(DailyOrderStat.day, start_of_week.date(), DailyOrderStat.orders_count),
+    )
+    # Quotes: counts and period figures per status in one pass
+    quote_rows = _aggregate_by_status(
+        Quote,
+        db.func.count(Quote.id),
+        count_since(Quote.created_at, start_of_month),
+        count_since(Quote.created_at, start_of_week),
+    )
+    total_clients, total_suppliers, total_products = db.session.query(
+        db.session.query(db.func.count(Client.id)).scalar_subquery(),
+        db.session.query(db.func.count(Supplier.id)).scalar_subquery(),
+        db.session.query(db.func.count(Product.id)).filter_by(active=True).scalar_subquery(),
+    ).one()
+    
+    def order_count(*statuses):
+        return sum(int(order_rows[s][1] or 0) for s in statuses if s in order_rows)
+    
+    def quote_count(*statuses):
+        return sum(quote_rows[s][1] for s in statuses if s in quote_rows)
+    
+    all_orders = list(order_rows.values())
+    all_quotes = list(quote_rows.values())
+    delivered = order_rows.get('delivered')
+    open_orders = [order_rows[s] for s in ['created', 'production', 'ready', 'shipping'] if s in order_rows]
+    
+    total_revenue = delivered[2] if delivered else 0
+    avg_ticket = (delivered[2] / delivered[1]) if delivered and delivered[1] else 0
+    revenue_this_month = delivered[6] if delivered else 0
+    completed_orders = order_count('delivered')
+    pending_quotes = quote_count('draft', 'pending', 'sent')
+    orders_in_production = order_count('production')
+    
+    total_quotes = _sum_rows(all_quotes, 1)
+    total_orders = int(_sum_rows(all_orders, 1))
+    
+    approved_quotes = quote_count('approved', 'converted')
+    conversion_rate = (approved_quotes / total_quotes * 100) if total_quotes > 0 else 0
+    
+    pending_orders = order_count('created', 'production', 'ready')
+    shipped_orders = order_count('shipping')
     
-    orders_this_month = Order.query.filter(Order.created_at >= start_of_month).count()
-    orders_this_week = Order.query.filter(Order.created_at >= start_of_week).count()
-    quotes_this_month = Quote.query.filter(Quote.created_at >= start_of_month).count()
-    quotes_this_week = Quote.query.filter(Quote.created_at >= start_of_week).count()
+    orders_this_month = int(_sum_rows(all_orders, 7))
+    orders_this_week = int(_sum_rows(all_orders, 8))
+    quotes_this_month = _sum_rows(all_quotes, 2)
+    quotes_this_week = _sum_rows(all_quotes, 3)
     
+    month_starts = _bucket_starts(_add_months(today.date(), -5), today.date(), 'month')
     orders_by_month = []
-    for i in range(5, -1, -1):
-        month_start = (today.replace(day=1) - timedelta(days=30*i)).replace(day=1)
-        if i > 0:
-            month_end = (month_start + timedelta(days=32)).replace(day=1)
-        else:
-            month_end = today + timedelta(days=1)
-        
-        count = Order.query.filter(
-            Order.created_at >= month_start,
-            Order.created_at < month_end
-        ).count()
-        
-        revenue = db.session.query(db.func.coalesce(db.func.sum(Order.total_value), 0)).filter(
-            Order.status == 'delivered',
-            Order.delivered_at >= month_start,
-            Order.delivered_at < month_end
-        ).scalar()
-        
+    for month_start, row in zip(month_starts, get_analytics(month_starts[0], today.date(), 'month')):
         orders_by_month.append({
             'month': month_start.strftime('%b'),
             'year': month_start.year,
-            'orders': count,
-            'revenue': float(revenue) if revenue else 0
+            'orders': row['orders'],
+            'revenue': row['revenue']
         })
     
-    orders_by_status = {
-        'created': Order.query.filter_by(status='created').count(),
-        'production': Order.query.filter_by(status='production').count(),
-        'ready': Order.query.filter_by(status='ready').count(),
-        'shipping': Order.query.filter_by(status='shipping').count(),
-        'delivered': Order.query.filter_by(status='delivered').count(),
-        'cancelled': Order.query.filter_by(status='cancelled').count()
-    }
-    
-    quotes_by_status = {
-        'draft': Quote.query.filter_by(status='draft').count(),
-        'sent': Quote.query.filter_by(status='sent').count(),
-        'approved': Quote.query.filter_by(status='approved').count(),
-        'converted': Quote.query.filter_by(status='converted').count(),
-        'rejected': Quote.query.filter_by(status='rejected').count()
-    }
+    orders_by_status = {status: order_count(status) for status in ORDER_STATUSES}
+    quotes_by_status = {status: quote_count(status) for status in QUOTE_STATUSES}
     
-    total_paid = db.session.query(db.func.coalesce(db.func.sum(Order.paid_value), 0)).scalar()
-    total_pending_payment = db.session.query(
-        db.func.coalesce(db.func.sum(Order.total_value - Order.paid_value), 0)
-    ).filter(Order.status.in_(['created', 'production', 'ready', 'shipping'])).scalar()
+    total_paid = _sum_rows(all_orders, 4)
+    total_pending_payment = _sum_rows(open_orders, 5)
     
     return {
         'total_revenue': float(total_revenue) if total_revenue else 0,
@@ -778,16 +1729,659 @@ def get_dashboard_metrics():
     }
 
 
+def get_cached_dashboard_metrics():
+    """Dashboard metrics served from the shared cache; write routes invalidate it on commit"""
+    return shared_cache.get_or_set('dashboard', get_dashboard_metrics, namespace='metrics')
+
+
+def data_validators(*parts, namespace='data'):
+    """Strong ETag and Last-Modified derived from a cache namespace version, without touching the database"""
+    try:
+        version, changed_at = shared_cache.version_info(namespace)
+    except Exception as e:
+        logging.warning(f"Validators unavailable: {e}")
+        return None, None
+    user_part = (current_user.id, current_user.name, current_user.role) if current_user.is_authenticated else None
+    raw = '|'.join(str(part) for part in (namespace, version, user_part) + parts)
+    etag = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+    last_modified = datetime.fromtimestamp(changed_at, tz=timezone.utc) if changed_at else None
+    return etag, last_modified
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response when the client's copy is current, otherwise None"""
+    if etag is None or session.get('_flashes'):
+        return None
+    if request.if_none_match:
+        if not request.if_none_match.contains(etag):
+            return None
+    elif not (last_modified and request.if_modified_since
+              and request.if_modified_since >= last_modified.replace(microsecond=0)):
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified and make browsers revalidate instead of reusing blindly"""
+    response = make_response(response)
+    if etag:
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def load_options(*options):
+    """Eager-loading options for a view, plus raiseload('*') in strict mode so missed relationships fail loudly"""
+    if app.config['RAISE_ON_LAZY_LOAD']:
+        options += (db.raiseload('*', sql_only=True),)
+    return options
+
+
+QUOTE_LIST_OPTIONS = (db.joinedload(Quote.client), db.selectinload(Quote.orders))
+QUOTE_DETAIL_OPTIONS = (
+    db.joinedload(Quote.client),
+    db.joinedload(Quote.seller),
+    db.joinedload(Quote.print_ref),
+    db.selectinload(Quote.orders),
+)
+ORDER_LIST_OPTIONS = (db.joinedload(Order.client), db.joinedload(Order.supplier))
+ORDER_DETAIL_OPTIONS = (db.joinedload(Order.client), db.joinedload(Order.supplier), db.joinedload(Order.quote))
+
+
+def encode_cursor(created_at, id):
+    raw = f"{created_at.isoformat()}|{id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a list cursor, or None when missing/invalid"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(query, model, cursor, per_page):
+    """Newest-first page of `query` after `cursor`, seeking on (created_at, id) instead of OFFSET"""
+    position = decode_cursor(cursor)
+    if position:
+        query = query.filter(db.tuple_(model.created_at, model.id) < position)
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def quote_pix_hash(quote):
+    """Payload hash of the PIX charge for the quote's down payment"""
+    return pix_store.register(build_payload(
+        quote.pix_key or app.config['PIX_DEFAULT_KEY'],
+        amount=quote.down_payment_value or None,
+        description=f"ORC{quote.quote_number}"
+    ))
+
+
+def order_pix_hash(order):
+    """Payload hash of the PIX charge for the order's remaining balance"""
+    balance = (order.total_value or 0) - (order.paid_value or 0)
+    return pix_store.register(build_payload(
+        (order.quote.pix_key if order.quote else None) or app.config['PIX_DEFAULT_KEY'],
+        amount=balance if balance > 0 else None,
+        description=order.order_number or ''
+    ))
+
+
+@app.template_global()
+def pix_qr_url(payload_hash, ext='svg'):
+    return url_for('pix_qr_image', payload_hash=payload_hash, ext=ext)
+
+
+@app.template_global()
+def responsive_image(path):
+    """src plus WebP/JPEG srcset for an upload path; external URLs pass through unchanged"""
+    if not path:
+        return None
+    if not path.startswith('uploads/'):
+        return {'src': path, 'webp': None, 'jpeg': None}
+    
+    def srcset(ext):
+        return ', '.join(
+            f"{url_for('static', filename=variant)} {width}w" for variant, width in image_variants.srcset(path, ext)
+        ) or None
+    
+    return {'src': url_for('static', filename=path), 'webp': srcset('webp'), 'jpeg': srcset('jpg')}
+
+
+def quote_pdf_assets(quote):
+    """Template arguments for quote_pdf.html plus the local files it uses"""
+    pix_qr_path = pix_store.image_path(quote_pix_hash(quote), 'png')
+    files = [PDF_STYLESHEET, PDF_LOGO_PATH, pix_qr_path]
+    
+    quote_image_url = None
+    if quote.image_path:
+        quote_image_path = os.path.join(app.root_path, 'static', quote.image_path)
+        if os.path.exists(quote_image_path):
+            # Embed the print-size derivative; the original upload can be a 5 MB photo
+            quote_image_path = pdf_image_variants.path_for(quote.image_path, 'pdf', 'jpg') or quote_image_path
+            quote_image_url = f"file://{quote_image_path}"
+            files.append(quote_image_path)
+    
+    return {
+        'stylesheet_url': f"file://{PDF_STYLESHEET}",
+        'logo_path': f"file://{PDF_LOGO_PATH}",
+        'pix_qr_code': f"file://{pix_qr_path}",
+        'quote_image_url': quote_image_url,
+    }, files
+
+
+def prepare_quote_pdf(quote):
+    """Render quote_pdf.html and return (html, cache_key).
+    
+    The key hashes the HTML (quote, seller, client and PIX payload) and the size/mtime of the
+    embedded images, so any edit yields a new PDF cache entry.
+    """
+    context, files = quote_pdf_assets(quote)
+    # Only for QuoteRenderer, which applies quote_pdf.css itself
+    html_content = render_template('quote_pdf.html', quote=quote, stylesheet_preloaded=True, **context)
+    return html_content, PdfCache.make_key(html_content, files)
+
+
+def _increment_counter(prefix, year):
+    """Bump the counter row (locking it until commit) and read it back; None if the row does not exist"""
+    table = DocumentCounter.__table__
+    key = (table.c.prefix == prefix) & (table.c.year == year)
+    result = db.session.execute(table.update().where(key).values(last_value=table.c.last_value + 1))
+    if result.rowcount == 0:
+        return None
+    return db.session.execute(db.select(table.c.last_value).where(key)).scalar()
+
+
+def _seed_counter(prefix, year, column):
+    """Create the year's counter, continuing after numbers already issued (e.g. by the old id-based scheme)"""
+    table = DocumentCounter.__table__
+    start = f'{prefix}-{year}-'
+    issued = db.session.execute(db.select(column).where(column.like(f'{start}%'))).scalars()
+    last_value = max((int(number[len(start):]) for number in issued if number[len(start):].isdigit()), default=0)
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # Two requests may seed the same year at once; the loser's row is simply dropped
+        stmt = insert(table).values(prefix=prefix, year=year, last_value=last_value).on_conflict_do_nothing(
+            index_elements=['prefix', 'year']
+        )
+    else:
+        stmt = table.insert().values(prefix=prefix, year=year, last_value=last_value)
+    db.session.execute(stmt)
+
+
+def allocate_document_number(prefix, column):
+    """Next PREFIX-YYYY-NNNN number, allocated in the caller's transaction.
+
+    The counter row stays locked until that transaction commits, so concurrent requests
+    get distinct numbers, and a rollback gives the number back.
+    """
+    year = datetime.now().year
+    value = _increment_counter(prefix, year)
+    if value is None:
+        _seed_counter(prefix, year, column)
+        value = _increment_counter(prefix, year)
+    return f'{prefix}-{year}-{value:04d}'
+
+
 def generate_quote_number():
-    last_quote = Quote.query.order_by(Quote.id.desc()).first()
-    num = (last_quote.id + 1) if last_quote else 1
-    return f'ORC-{datetime.now().year}-{num:04d}'
+    return allocate_document_number('ORC', Quote.quote_number)
 
 
 def generate_order_number():
-    last_order = Order.query.order_by(Order.id.desc()).first()
-    num = (last_order.id + 1) if last_order else 1
-    return f'PED-{datetime.now().year}-{num:04d}'
+    return allocate_document_number('PED', Order.order_number)
+
+
+# ==================== PDF JOBS ====================
+
+ACTIVE_PDF_JOB_STATUSES = ('queued', 'running')
+
+
+def enqueue_pdf_job(quote, action='download'):
+    """Create (or reuse) a background render of the quote's PDF.
+    
+    Returns None when the queue is full. Downloads whose PDF is already cached come back done.
+    """
+    html_content, key = prepare_quote_pdf(quote)
+    
+    job = PdfJob.query.filter(
+        PdfJob.cache_key == key,
+        PdfJob.action == action,
+        PdfJob.status.in_(ACTIVE_PDF_JOB_STATUSES)
+    ).order_by(PdfJob.id.desc()).first()
+    if job and not pdf_job_is_stale(job):
+        return job
+    
+    if live_pdf_jobs().count() >= app.config['PDF_JOB_QUEUE_LIMIT']:
+        return None
+    
+    job = PdfJob(
+        quote_id=quote.id,
+        cache_key=key,
+        action=action,
+        requested_by=current_user.id if current_user.is_authenticated else None
+    )
+    if action == 'download' and pdf_cache.get(key) is not None:
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+    db.session.add(job)
+    db.session.commit()
+    
+    if job.status != 'done':
+        dispatch_pdf_job(job, html_content)
+    return job
+
+
+def dispatch_pdf_job(job, html_content):
+    """Hand the HTML to the render pool; finish_pdf_job runs when the process is done"""
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    job.worker_pid = os.getpid()
+    job.error_message = None
+    db.session.commit()
+    try:
+        future = render_pool.submit(
+            render_to_cache, html_content, pdf_cache.directory, pdf_cache.max_bytes, job.cache_key
+        )
+    except (BrokenProcessPool, RuntimeError) as e:
+        render_pool.shutdown()
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        logging.error(f"Could not dispatch PDF job {job.id}: {e}")
+        return
+    future.add_done_callback(partial(finish_pdf_job, job.id))
+
+
+def finish_pdf_job(job_id, future):
+    """Record the render outcome; runs on the pool's callback thread"""
+    with app.app_context():
+        job = db.session.get(PdfJob, job_id)
+        if job is None:
+            return
+        try:
+            _, elapsed, _ = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                render_pool.shutdown()
+            job.status = 'failed'
+            job.error_message = str(e) or e.__class__.__name__
+            logging.error(f"PDF job {job.id} for quote {job.quote_id} failed: {job.error_message}")
+        else:
+            telemetry.observe('emunah_pdf_render_duration_seconds', elapsed, {'route': job.action})
+            job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        telemetry.inc('emunah_pdf_jobs_total', {'action': job.action, 'outcome': job.status})
+        
+        if job.status == 'done' and job.action == 'email':
+            pdf_data = pdf_cache.get(job.cache_key)
+            if pdf_data is not None:
+                send_quote_pdf_email(job.quote, pdf_data)
+        db.session.remove()
+
+
+def pdf_job_stale_before():
+    return datetime.utcnow() - timedelta(seconds=app.config['PDF_JOB_TIMEOUT'])
+
+
+def pdf_job_is_stale(job):
+    """True when an unfinished job outlived PDF_JOB_TIMEOUT (e.g. its gunicorn worker was restarted)"""
+    if job.status not in ACTIVE_PDF_JOB_STATUSES:
+        return False
+    return (job.started_at or job.created_at) < pdf_job_stale_before()
+
+
+def live_pdf_jobs():
+    """Unfinished jobs that are not stale; dead ones do not take up room in the queue"""
+    since = db.func.coalesce(PdfJob.started_at, PdfJob.created_at)
+    return PdfJob.query.filter(PdfJob.status.in_(ACTIVE_PDF_JOB_STATUSES), since >= pdf_job_stale_before())
+
+
+def claim_stale_pdf_job(job):
+    """Take over a stale job with a conditional UPDATE; False when another worker got to it first"""
+    table = PdfJob.__table__
+    result = db.session.execute(table.update().where(
+        table.c.id == job.id,
+        table.c.status.in_(ACTIVE_PDF_JOB_STATUSES),
+        db.func.coalesce(table.c.started_at, table.c.created_at) < pdf_job_stale_before(),
+    ).values(started_at=datetime.utcnow(), worker_pid=os.getpid()))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def resume_pdf_job(job):
+    """Re-render a stale job, or a finished one whose PDF was evicted from the cache"""
+    html_content, key = prepare_quote_pdf(job.quote)
+    job.cache_key = key
+    dispatch_pdf_job(job, html_content)
+
+
+def resume_stale_pdf_jobs():
+    """pdf_job_sweeper task: re-dispatch jobs whose worker died, including email jobs nobody polls"""
+    with app.app_context():
+        try:
+            since = db.func.coalesce(PdfJob.started_at, PdfJob.created_at)
+            stale_ids = [job_id for (job_id,) in db.session.query(PdfJob.id).filter(
+                PdfJob.status.in_(ACTIVE_PDF_JOB_STATUSES), since < pdf_job_stale_before()
+            ).order_by(PdfJob.id).limit(app.config['PDF_JOB_QUEUE_LIMIT'])]
+            for job_id in stale_ids:
+                job = db.session.get(PdfJob, job_id)
+                if job is None or not claim_stale_pdf_job(job):
+                    continue
+                logging.warning(f"Resuming stale PDF job {job.id} ({job.action}) for quote {job.quote_id}")
+                try:
+                    resume_pdf_job(job)
+                except Exception as e:
+                    db.session.rollback()
+                    job.status = 'failed'
+                    job.error_message = str(e) or e.__class__.__name__
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+                    logging.error(f"Could not resume PDF job {job.id}: {job.error_message}")
+        finally:
+            db.session.remove()
+    return False
+
+
+def sweep_background_jobs():
+    """pdf_job_sweeper drain: resume stale PDF jobs, then fail dead exports and expire old ZIPs"""
+    resume_stale_pdf_jobs()
+    sweep_export_jobs()
+    return False
+
+
+pdf_job_sweeper = OutboxWorker(sweep_background_jobs, interval=60, name='pdf-job-sweeper')
+
+
+def get_pdf_job_or_404(job_id):
+    """A job the current user may see: one they requested, one for a quote they sell, or any for admins"""
+    job = PdfJob.query.get_or_404(job_id)
+    if current_user.role != 'ADMIN' and current_user.id not in (job.requested_by, job.quote.seller_id):
+        abort(404)
+    return job
+
+
+def pdf_job_payload(job):
+    payload = {
+        'id': job.id,
+        'quote_id': job.quote_id,
+        'quote_number': job.quote.quote_number,
+        'action': job.action,
+        'status': job.status,
+        'error': job.error_message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': url_for('pdf_job_status', job_id=job.id),
+    }
+    if job.status == 'done' and job.action == 'download':
+        payload['download_url'] = url_for('download_pdf_job', job_id=job.id)
+    return payload
+
+
+def pdf_filename(quote):
+    return f"Orcamento_{quote.quote_number.replace('-', '_')}.pdf"
+
+
+def pdf_attachment_response(quote, pdf_data):
+    response = make_response(pdf_data)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename="{pdf_filename(quote)}"'
+    return response
+
+
+# ==================== PDF EXPORT ====================
+
+def export_quote_ids(status=None, start=None, end=None, seller_id=None, ids=None):
+    """IDs of the quotes matching the export filter, oldest first"""
+    query = db.session.query(Quote.id)
+    if ids:
+        query = query.filter(Quote.id.in_(ids))
+    if status:
+        query = query.filter(Quote.status == status)
+    if start:
+        query = query.filter(Quote.created_at >= datetime.combine(start, datetime.min.time()))
+    if end:
+        query = query.filter(Quote.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if seller_id:
+        query = query.filter(Quote.seller_id == seller_id)
+    return [row.id for row in query.order_by(Quote.created_at, Quote.id)]
+
+
+def iter_quotes_zip(quote_ids, pool):
+    """Yield a ZIP with one PDF per quote, chunk by chunk.
+    
+    Cached PDFs go out as soon as they are found; the rest are rendered in parallel and written
+    in the order they finish. Only file names and cache keys are kept for the whole batch.
+    """
+    archive = ZipStream()
+    names = {}
+    ready = []
+    failures = []
+    
+    def render_tasks():
+        for quote_id in quote_ids:
+            quote = Quote.query.options(*load_options(*QUOTE_DETAIL_OPTIONS)).filter_by(id=quote_id).first()
+            if quote is None:
+                continue
+            names[quote_id] = pdf_filename(quote)
+            html_content, key = prepare_quote_pdf(quote)
+            db.session.expunge(quote)
+            if pdf_cache.has(key):
+                ready.append((quote_id, key))
+            else:
+                yield quote_id, key, html_content
+    
+    def write_ready():
+        while ready:
+            quote_id, key = ready.pop(0)
+            pdf_data = pdf_cache.get(key)
+            if pdf_data is None:
+                failures.append((names[quote_id], 'PDF removido do cache durante a exportação'))
+                continue
+            yield archive.add(names[quote_id], pdf_data)
+    
+    results = render_unordered(render_tasks(), pdf_cache.directory, pdf_cache.max_bytes, pool)
+    for quote_id, key, error in results:
+        yield from write_ready()
+        if isinstance(error, BrokenProcessPool):
+            pool.shutdown()  # the next submit starts a fresh pool
+        if error is not None:
+            logging.error(f"Export: PDF for quote {quote_id} failed: {error}")
+            failures.append((names[quote_id], str(error) or error.__class__.__name__))
+        else:
+            ready.append((quote_id, key))
+            yield from write_ready()
+    yield from write_ready()
+    
+    if failures:
+        report = '\n'.join(f'{name}: {error}' for name, error in failures)
+        yield archive.add('ERROS.txt', report.encode('utf-8'))
+    yield archive.close()
+
+
+def export_file_path(job_id):
+    return os.path.join(app.config['PDF_EXPORT_DIR'], f'{job_id}.zip')
+
+
+def export_filename(job):
+    return f"Cotacoes_{job.created_at.strftime('%Y%m%d_%H%M')}.zip"
+
+
+def start_export_job(job, slot):
+    """Build the job's ZIP on a background thread, which releases the export slot when it is done"""
+    thread = threading.Thread(target=run_export_job, args=(job.id, slot), name=f'export-job-{job.id}', daemon=True)
+    try:
+        thread.start()
+    except RuntimeError:
+        export_slots.release(slot)
+        raise
+
+
+def run_export_job(job_id, slot):
+    """Write the ZIP of one export job, rendering on its own pool of PDF_EXPORT_PROCESSES.
+    
+    The ZIP goes to a temporary file that is renamed only once complete, so a download never
+    sees half an archive.
+    """
+    path = export_file_path(job_id)
+    tmp_path = f'{path}.tmp'
+    pool = RenderPool(app.config['PDF_EXPORT_PROCESSES'], PDF_RENDERER_ARGS)
+    try:
+        with app.test_request_context():
+            try:
+                job = db.session.get(ExportJob, job_id)
+                if job is None:
+                    return
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                job.worker_pid = os.getpid()
+                db.session.commit()
+                quote_ids = list(job.quote_ids)
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in iter_quotes_zip(quote_ids, pool):
+                            f.write(chunk)
+                    os.replace(tmp_path, path)
+                except Exception as e:
+                    db.session.rollback()
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    job.status = 'failed'
+                    job.error_message = str(e) or e.__class__.__name__
+                    logging.error(f"Export job {job_id} failed: {job.error_message}")
+                else:
+                    job.status = 'done'
+                    job.error_message = None
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                telemetry.inc('emunah_pdf_jobs_total', {'action': 'export', 'outcome': job.status})
+            finally:
+                db.session.remove()
+    finally:
+        pool.shutdown()
+        export_slots.release(slot)
+
+
+def sweep_export_jobs():
+    """Fail exports whose worker died (their slot is already free) and delete ZIPs past PDF_EXPORT_KEEP_HOURS"""
+    with app.app_context():
+        try:
+            now = datetime.utcnow()
+            since = db.func.coalesce(ExportJob.started_at, ExportJob.created_at)
+            stale = ExportJob.query.filter(
+                ExportJob.status.in_(ACTIVE_PDF_JOB_STATUSES),
+                since < now - timedelta(seconds=app.config['PDF_EXPORT_TIMEOUT'])
+            ).all()
+            for job in stale:
+                job.status = 'failed'
+                job.error_message = 'Exportação interrompida (o processo foi reiniciado). Tente novamente.'
+                job.finished_at = now
+                logging.warning(f"Export job {job.id} marked failed after PDF_EXPORT_TIMEOUT")
+            
+            expired = ExportJob.query.filter(
+                ExportJob.status == 'done',
+                ExportJob.finished_at < now - timedelta(hours=app.config['PDF_EXPORT_KEEP_HOURS'])
+            ).all()
+            for job in expired:
+                path = export_file_path(job.id)
+                if os.path.exists(path):
+                    os.remove(path)
+                job.status = 'expired'
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def get_export_job_or_404(job_id):
+    """An export the current user may see: one they requested, or any for admins"""
+    job = ExportJob.query.get_or_404(job_id)
+    if current_user.role != 'ADMIN' and current_user.id != job.requested_by:
+        abort(404)
+    return job
+
+
+def export_job_payload(job):
+    payload = {
+        'id': job.id,
+        'quote_count': len(job.quote_ids),
+        'status': job.status,
+        'error': job.error_message,
+        'filename': export_filename(job),
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': url_for('export_job_status', job_id=job.id),
+    }
+    if job.status == 'done':
+        payload['download_url'] = url_for('download_export_job', job_id=job.id)
+    return payload
+
+
+@app.cli.command('build-image-variants')
+@click.option('--force', is_flag=True, help='Rebuild variants that already exist')
+def build_image_variants_command(force):
+    """Create thumbnail/medium variants for uploads under static/uploads"""
+    written = failed = 0
+    for folder in (app.config['UPLOAD_FOLDER'], PRINTS_UPLOAD_FOLDER):
+        for name in sorted(os.listdir(folder)):
+            if is_variant(name) or not allowed_file(name):
+                continue
+            rel_path = os.path.relpath(os.path.join(folder, name), image_variants.static_root).replace(os.sep, '/')
+            try:
+                written += image_variants.generate(rel_path, force=force)
+                if folder == app.config['UPLOAD_FOLDER']:
+                    written += pdf_image_variants.generate(rel_path, force=force)
+            except Exception as e:
+                failed += 1
+                print(f"{rel_path}: {e}")
+    print(f"Wrote {written} variants ({failed} images failed)")
+
+
+@app.cli.command('export-quotes')
+@click.option('--status', help='Only quotes with this status')
+@click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m-%d']), help='Created on or after (YYYY-MM-DD)')
+@click.option('--to', 'end', type=click.DateTime(formats=['%Y-%m-%d']), help='Created on or before (YYYY-MM-DD)')
+@click.option('--seller-id', type=int, help='Only quotes of this seller')
+@click.option('--ids', help='Comma-separated quote IDs')
+@click.option('--output', default='cotacoes.zip', show_default=True, help='ZIP file to write')
+def export_quotes_command(status, start, end, seller_id, ids, output):
+    """Render the PDFs of the matching quotes in parallel into a ZIP file."""
+    quote_ids = export_quote_ids(
+        status=status,
+        start=start.date() if start else None,
+        end=end.date() if end else None,
+        seller_id=seller_id,
+        ids=[int(part) for part in ids.split(',') if part.strip()] if ids else None
+    )
+    if not quote_ids:
+        print('No quotes match the filter.')
+        return
+    started = time.perf_counter()
+    pool = RenderPool(app.config['PDF_EXPORT_PROCESSES'], PDF_RENDERER_ARGS)
+    try:
+        with app.test_request_context(), open(output, 'wb') as f:
+            for chunk in iter_quotes_zip(quote_ids, pool):
+                f.write(chunk)
+    finally:
+        pool.shutdown()
+    print(f'{len(quote_ids)} quotes exported to {output} in {time.perf_counter() - started:.1f}s')
 
 
 # ==================== ROUTES ====================
@@ -819,9 +2413,9 @@ def logout():
 @app.route('/')
 @login_required
 def dashboard():
-    metrics = get_dashboard_metrics()
-    orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
-    quotes = Quote.query.order_by(Quote.created_at.desc()).limit(5).all()
+    metrics = get_cached_dashboard_metrics()
+    orders = Order.query.options(*load_options(db.joinedload(Order.client))).order_by(Order.created_at.desc()).limit(5).all()
+    quotes = Quote.query.options(*load_options(db.joinedload(Quote.client))).order_by(Quote.created_at.desc()).limit(5).all()
     return render_template('dashboard.html', metrics=metrics, orders=orders, quotes=quotes)
 
 
@@ -831,11 +2425,72 @@ def dashboard():
 @login_required
 def quotes():
     status_filter = request.args.get('status', '')
-    query = Quote.query.order_by(Quote.created_at.desc())
+    cursor = request.args.get('cursor', '')
+    query = Quote.query.options(*load_options(*QUOTE_LIST_OPTIONS))
     if status_filter:
         query = query.filter_by(status=status_filter)
-    quotes_list = query.all()
-    return render_template('quotes.html', quotes=quotes_list, current_status=status_filter)
+    quotes_list, next_cursor = keyset_page(query, Quote, cursor, app.config['LIST_PAGE_SIZE'])
+    return render_template('quotes.html', quotes=quotes_list, current_status=status_filter,
+                           cursor=cursor, next_cursor=next_cursor)
+
+
+@app.route('/quotes/export.zip')
+@login_required
+def export_quotes_zip():
+    """ZIP with the PDFs of the quotes matching ?status=&from=&to=&seller_id=&ids=1,2,3"""
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+        seller_id = int(request.args['seller_id']) if request.args.get('seller_id') else None
+        ids = [int(part) for part in request.args.get('ids', '').split(',') if part.strip()]
+    except ValueError:
+        flash('Filtro de exportação inválido (datas em YYYY-MM-DD, IDs numéricos).', 'error')
+        return redirect(url_for('quotes'))
+    
+    quote_ids = export_quote_ids(request.args.get('status'), start, end, seller_id, ids)
+    if not quote_ids:
+        flash('Nenhuma cotação encontrada para exportar.', 'warning')
+        return redirect(url_for('quotes'))
+    
+    # Each export runs its own pool of PDF_EXPORT_PROCESSES: cap how many run on the host at once
+    slot = export_slots.acquire()
+    if slot is None:
+        flash('Já há uma exportação em andamento. Tente novamente em instantes.', 'warning')
+        return redirect(url_for('quotes'))
+    
+    try:
+        job = ExportJob(quote_ids=quote_ids, requested_by=current_user.id)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        export_slots.release(slot)
+        raise
+    start_export_job(job, slot)
+    return redirect(url_for('view_export_job', job_id=job.id))
+
+
+@app.route('/exports/<int:job_id>')
+@login_required
+def view_export_job(job_id):
+    """Waiting page of a ZIP export; the download starts when the file is ready"""
+    job = get_export_job_or_404(job_id)
+    return render_template('export_job.html', job=export_job_payload(job))
+
+
+@app.route('/exports/<int:job_id>/status')
+@login_required
+def export_job_status(job_id):
+    return jsonify(export_job_payload(get_export_job_or_404(job_id)))
+
+
+@app.route('/exports/<int:job_id>/download')
+@login_required
+def download_export_job(job_id):
+    job = get_export_job_or_404(job_id)
+    path = export_file_path(job.id)
+    if job.status != 'done' or not os.path.exists(path):
+        return jsonify(export_job_payload(job)), 409
+    return send_file(path, mimetype='application/zip', as_attachment=True, download_name=export_filename(job))
 
 
 @app.route('/quotes/new', methods=['GET', 'POST'])
@@ -899,7 +2554,7 @@ def new_quote():
         if 'quote_image' in request.files:
             file = request.files['quote_image']
             if file and file.filename:
-                image_path = save_quote_image(file, quote.id)
+                image_path = save_quote_image(file)
                 if image_path:
                     quote.image_path = image_path
                     db.session.commit()
@@ -918,8 +2573,12 @@ def new_quote():
 @app.route('/quotes/<int:id>')
 @login_required
 def view_quote(id):
-    quote = Quote.query.get_or_404(id)
-    return render_template('quote_view.html', quote=quote)
+    etag, last_modified = data_validators('quote', id)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+    quote = Quote.query.options(*load_options(*QUOTE_DETAIL_OPTIONS)).filter_by(id=id).first_or_404()
+    return with_validators(render_template('quote_view.html', quote=quote, pix_hash=quote_pix_hash(quote)), etag, last_modified)
 
 
 @app.route('/quotes/<int:id>/edit', methods=['GET', 'POST'])
@@ -971,7 +2630,7 @@ def edit_quote(id):
                 if quote.image_path:
                     delete_quote_image(quote.image_path)
                 # Save new image
-                image_path = save_quote_image(file, quote.id)
+                image_path = save_quote_image(file)
                 if image_path:
                     quote.image_path = image_path
         
@@ -1002,7 +2661,7 @@ def send_quote(id):
     
     # Send email to client
     if send_quote_email(quote, to_client=True):
-        flash('Cotação enviada por email com sucesso!', 'success')
+        flash('Cotação marcada como enviada. O email será entregue em instantes.', 'success')
     else:
         flash('Cotação marcada como enviada. (Email não configurado)', 'info')
     
@@ -1052,7 +2711,7 @@ def approve_quote(id):
     # Send confirmation emails
     emails = send_order_confirmation_email(order, to_client=True, to_supplier=True)
     if emails:
-        flash(f'Pedido #{order.order_number} criado! Emails enviados para: {", ".join(emails)}', 'success')
+        flash(f'Pedido #{order.order_number} criado! Emails na fila de envio para: {", ".join(emails)}', 'success')
     else:
         flash(f'Pedido #{order.order_number} criado com sucesso!', 'success')
     
@@ -1073,6 +2732,8 @@ def reject_quote(id):
 @login_required
 def delete_quote(id):
     quote = Quote.query.get_or_404(id)
+    if quote.image_path:
+        delete_quote_image(quote.image_path)
     db.session.delete(quote)
     db.session.commit()
     flash('Cotação excluída com sucesso!', 'success')
@@ -1082,52 +2743,53 @@ def delete_quote(id):
 @app.route('/quotes/<int:id>/pdf')
 @login_required
 def download_quote_pdf(id):
-    """Generate and download quote as PDF"""
-    from weasyprint import HTML, CSS
-    
-    quote = Quote.query.get_or_404(id)
-    
-    logo_path = os.path.join(app.root_path, 'static', 'images', 'logo_emunah.png')
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(app.root_path, 'static', 'images', 'logo.png')
-    
-    logo_url = f"file://{logo_path}"
-    
-    pix_qr_path = os.path.join(app.root_path, 'static', 'images', 'pix_qrcode.png')
-    if os.path.exists(pix_qr_path):
-        pix_qr_code = f"file://{pix_qr_path}"
-    else:
-        pix_qr_code = generate_pix_qrcode(
-            pix_key=quote.pix_key or '11998896725',
-            amount=float(quote.down_payment_value) if quote.down_payment_value else None,
-            name="Emunah",
-            city="Sao Paulo",
-            description=f"ORC{quote.quote_number}"
-        )
-    
-    quote_image_url = None
-    if quote.image_path:
-        quote_image_path = os.path.join(app.root_path, 'static', quote.image_path)
-        if os.path.exists(quote_image_path):
-            quote_image_url = f"file://{quote_image_path}"
-    
-    html_content = render_template('quote_pdf.html', 
-                                   quote=quote, 
-                                   logo_path=logo_url,
-                                   pix_qr_code=pix_qr_code,
-                                   quote_image_url=quote_image_url)
-    
-    pdf_buffer = BytesIO()
-    HTML(string=html_content, base_url=app.root_path).write_pdf(pdf_buffer)
-    pdf_buffer.seek(0)
-    
-    filename = f"Orcamento_{quote.quote_number.replace('-', '_')}.pdf"
-    
-    response = make_response(pdf_buffer.read())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    """Download the quote PDF; when it is not rendered yet, queue it and show a waiting page"""
+    quote = Quote.query.options(*load_options(*QUOTE_DETAIL_OPTIONS)).filter_by(id=id).first_or_404()
+    
+    _, key = prepare_quote_pdf(quote)
+    pdf_data = pdf_cache.get(key)
+    if pdf_data is not None:
+        telemetry.inc('emunah_pdf_cache_total', {'outcome': 'hit'})
+        return pdf_attachment_response(quote, pdf_data)
+    telemetry.inc('emunah_pdf_cache_total', {'outcome': 'miss'})
+    
+    job = enqueue_pdf_job(quote)
+    if job is None:
+        flash('Muitos PDFs sendo gerados no momento. Tente novamente em instantes.', 'warning')
+        return redirect(url_for('view_quote', id=quote.id))
+    return render_template('pdf_job.html', quote=quote, job=pdf_job_payload(job))
+
+
+@app.route('/quotes/<int:id>/pdf/jobs', methods=['POST'])
+@login_required
+def create_pdf_job(id):
+    """Queue a background render of the quote PDF"""
+    quote = Quote.query.options(*load_options(*QUOTE_DETAIL_OPTIONS)).filter_by(id=id).first_or_404()
+    job = enqueue_pdf_job(quote)
+    if job is None:
+        return jsonify({'error': 'Fila de PDFs cheia, tente novamente em instantes'}), 503
+    return jsonify(pdf_job_payload(job)), 202
+
+
+@app.route('/pdf-jobs/<int:job_id>')
+@login_required
+def pdf_job_status(job_id):
+    job = get_pdf_job_or_404(job_id)
+    if pdf_job_is_stale(job) and claim_stale_pdf_job(job):
+        resume_pdf_job(job)
+    return jsonify(pdf_job_payload(job))
+
+
+@app.route('/pdf-jobs/<int:job_id>/download')
+@login_required
+def download_pdf_job(job_id):
+    job = get_pdf_job_or_404(job_id)
+    if job.status == 'done':
+        pdf_data = pdf_cache.get(job.cache_key)
+        if pdf_data is not None:
+            return pdf_attachment_response(job.quote, pdf_data)
+        resume_pdf_job(job)
+    return jsonify(pdf_job_payload(job)), 409
 
 
 @app.route('/quotes/<int:id>/whatsapp')
@@ -1181,113 +2843,30 @@ Ficamos à disposição para qualquer dúvida!
 @login_required
 def email_quote_pdf(id):
     """Send quote PDF via email"""
-    from weasyprint import HTML
-    
-    quote = Quote.query.get_or_404(id)
+    quote = Quote.query.options(*load_options(*QUOTE_DETAIL_OPTIONS)).filter_by(id=id).first_or_404()
     client_email = quote.get_client_email()
     
     if not client_email:
         flash('Cliente não possui email cadastrado.', 'error')
         return redirect(url_for('view_quote', id=quote.id))
     
-    logo_path = os.path.join(app.root_path, 'static', 'images', 'logo_emunah.png')
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(app.root_path, 'static', 'images', 'logo.png')
-    
-    logo_url = f"file://{logo_path}"
-    
-    html_content = render_template('quote_pdf.html', quote=quote, logo_path=logo_url)
-    
-    pdf_buffer = BytesIO()
-    HTML(string=html_content, base_url=app.root_path).write_pdf(pdf_buffer)
-    pdf_data = pdf_buffer.getvalue()
-    
-    subject = f"Emunah - Orçamento #{quote.quote_number}"
-    
-    email_html = f"""
-    <html>
-    <body style="font-family: 'Inter', Arial, sans-serif; background-color: #F5EDE6; padding: 20px;">
-        <div style="max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px;">
-            <div style="text-align: center; margin-bottom: 20px;">
-                <h1 style="color: #520B1B; font-family: 'Playfair Display', serif;">Emunah</h1>
-                <p style="color: #666;">Vista-se com propósito</p>
-            </div>
-            <h2 style="color: #520B1B;">Orçamento #{quote.quote_number}</h2>
-            <p>Olá {quote.get_client_name()},</p>
-            <p>Segue em anexo o orçamento solicitado.</p>
-            <div style="background: #F5EDE6; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                <p><strong>Valor Total:</strong> R$ {quote.total_price or 0:.2f}</p>
-                <p><strong>Sinal ({quote.down_payment_percent}%):</strong> R$ {quote.down_payment_value or 0:.2f}</p>
-                <p><strong>Prazo:</strong> {quote.delivery_days or 15} dias úteis</p>
-            </div>
-            <p><strong>PIX para pagamento:</strong> {quote.pix_key}</p>
-            <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
-            <p style="font-style: italic; color: #520B1B; text-align: center;">
-                "Tudo posso naquele que me fortalece." - Filipenses 4:13
-            </p>
-            <p style="color: #666; font-size: 12px; text-align: center;">
-                Emunah - Vista-se com propósito<br>
-                Contato: (11) 99889-6725
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    if not app.config['MAIL_USERNAME'] or not app.config['MAIL_PASSWORD']:
+    if not mail_configured():
         flash('Configuração de email não encontrada. Baixe o PDF e envie manualmente.', 'warning')
         return redirect(url_for('view_quote', id=quote.id))
     
-    try:
-        from email.mime.base import MIMEBase
-        from email import encoders
-        
-        msg = MIMEMultipart()
-        msg['Subject'] = subject
-        msg['From'] = app.config['MAIL_DEFAULT_SENDER']
-        msg['To'] = client_email
-        
-        msg.attach(MIMEText(email_html, 'html'))
-        
-        pdf_attachment = MIMEBase('application', 'pdf')
-        pdf_attachment.set_payload(pdf_data)
-        encoders.encode_base64(pdf_attachment)
-        pdf_attachment.add_header('Content-Disposition', f'attachment; filename="Orcamento_{quote.quote_number}.pdf"')
-        msg.attach(pdf_attachment)
-        
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-        server.starttls()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        server.sendmail(app.config['MAIL_DEFAULT_SENDER'], client_email, msg.as_string())
-        server.quit()
-        
-        quote.status = 'sent'
-        quote.sent_at = datetime.utcnow()
-        db.session.commit()
-        
-        email_log = EmailLog(
-            recipient=client_email,
-            subject=subject,
-            email_type='quote_pdf',
-            status='sent'
-        )
-        db.session.add(email_log)
-        db.session.commit()
-        
-        flash(f'Orçamento enviado por email para {client_email} com sucesso!', 'success')
-        
-    except Exception as e:
-        logging.error(f"Failed to send email with PDF to {client_email}: {str(e)}")
-        email_log = EmailLog(
-            recipient=client_email,
-            subject=subject,
-            email_type='quote_pdf',
-            status='failed',
-            error_message=str(e)
-        )
-        db.session.add(email_log)
-        db.session.commit()
-        flash(f'Erro ao enviar email: {str(e)}. Baixe o PDF e envie manualmente.', 'error')
+    _, key = prepare_quote_pdf(quote)
+    pdf_data = pdf_cache.get(key)
+    if pdf_data is None:
+        # Render in the background; finish_pdf_job sends the email once the PDF exists
+        job = enqueue_pdf_job(quote, action='email')
+        if job is None:
+            flash('Muitos PDFs sendo gerados no momento. Tente novamente em instantes.', 'warning')
+        else:
+            flash(f'O PDF está sendo gerado e será enviado para {client_email} assim que ficar pronto.', 'info')
+        return redirect(url_for('view_quote', id=quote.id))
+    
+    send_quote_pdf_email(quote, pdf_data)
+    flash(f'Orçamento na fila de envio para {client_email}; o email sai em instantes.', 'success')
     
     return redirect(url_for('view_quote', id=quote.id))
 
@@ -1298,18 +2877,24 @@ def email_quote_pdf(id):
 @login_required
 def orders():
     status_filter = request.args.get('status', '')
-    query = Order.query.order_by(Order.created_at.desc())
+    cursor = request.args.get('cursor', '')
+    query = Order.query.options(*load_options(*ORDER_LIST_OPTIONS))
     if status_filter:
         query = query.filter_by(status=status_filter)
-    orders_list = query.all()
-    return render_template('orders.html', orders=orders_list, current_status=status_filter)
+    orders_list, next_cursor = keyset_page(query, Order, cursor, app.config['LIST_PAGE_SIZE'])
+    return render_template('orders.html', orders=orders_list, current_status=status_filter,
+                           cursor=cursor, next_cursor=next_cursor)
 
 
 @app.route('/orders/<int:id>')
 @login_required
 def view_order(id):
-    order = Order.query.get_or_404(id)
-    return render_template('order_view.html', order=order)
+    etag, last_modified = data_validators('order', id)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+    order = Order.query.options(*load_options(*ORDER_DETAIL_OPTIONS)).filter_by(id=id).first_or_404()
+    return with_validators(render_template('order_view.html', order=order, pix_hash=order_pix_hash(order)), etag, last_modified)
 
 
 @app.route('/orders/<int:id>/edit', methods=['GET', 'POST'])
@@ -1369,7 +2954,7 @@ def update_order_status(id):
         # Send notification on ready/shipping
         if new_status in ['ready', 'shipping'] and old_status not in ['ready', 'shipping', 'delivered']:
             if send_delivery_notification(order):
-                flash('Notificação enviada ao cliente!', 'success')
+                flash('Notificação ao cliente na fila de envio!', 'success')
         
         db.session.commit()
         flash(f'Status atualizado para: {new_status}', 'success')
@@ -1485,7 +3070,7 @@ def new_print():
         if image_source == 'upload' and 'print_image' in request.files:
             file = request.files['print_image']
             if file and file.filename:
-                image_path = save_print_image(file, print_item.id)
+                image_path = save_print_image(file)
                 if image_path:
                     print_item.file_url = image_path
                     db.session.commit()
@@ -1523,7 +3108,7 @@ def edit_print(id):
                 old_image = print_item.file_url
                 if old_image and old_image.startswith('uploads/prints/'):
                     delete_print_image(old_image)
-                image_path = save_print_image(file, print_item.id)
+                image_path = save_print_image(file)
                 if image_path:
                     print_item.file_url = image_path
         
@@ -1790,6 +3375,7 @@ def edit_user(id):
         if request.form.get('password'):
             user.set_password(request.form.get('password'))
         db.session.commit()
+        invalidate_user_identity(user.id)
         flash('Usuário atualizado com sucesso!', 'success')
         return redirect(url_for('users'))
     return render_template('user_form.html', user=user)
@@ -1807,10 +3393,28 @@ def delete_user(id):
         return redirect(url_for('users'))
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_identity(id)
     flash('Usuário excluído com sucesso!', 'success')
     return redirect(url_for('users'))
 
 
+@app.route('/admin/sql')
+@login_required
+def sql_stats():
+    """Per-route SQL aggregates of this worker since it started"""
+    if current_user.role != 'ADMIN':
+        flash('Acesso não autorizado', 'error')
+        return redirect(url_for('dashboard'))
+    with route_sql_stats_lock:
+        rows = [dict(stats, endpoint=endpoint) for endpoint, stats in route_sql_stats.items()]
+    for row in rows:
+        row['avg_queries'] = row['queries'] / row['requests']
+        row['avg_sql_ms'] = row['sql_ms'] / row['requests']
+        row['avg_total_ms'] = row['total_ms'] / row['requests']
+    rows.sort(key=lambda row: row['sql_ms'], reverse=True)
+    return render_template('sql_stats.html', rows=rows, since=route_sql_stats_since, pid=os.getpid())
+
+
 # ==================== HEALTH CHECK ====================
 
 @app.route('/health')
@@ -1834,24 +3438,109 @@ def health_check():
         }), 503
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint with numbers from every worker of this instance"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    record_pool_gauges()
+    return Response(telemetry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/pix/<payload_hash>.<any(png, svg):ext>')
+def pix_qr_image(payload_hash, ext):
+    """PIX QR image; the URL is derived from the payload, so the file never changes"""
+    path = pix_store.image_path(payload_hash, ext)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype='image/png' if ext == 'png' else 'image/svg+xml',
+                         etag=payload_hash, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 # ==================== API ====================
 
 @app.route('/api/metrics')
 @login_required
 def api_metrics():
-    return jsonify(get_dashboard_metrics())
+    # Period figures (this week/month) also move with time, so the ETag rolls over with the TTL
+    window = int(time.time() // max(app.config['METRICS_CACHE_TTL'], 1))
+    etag, last_modified = data_validators('metrics', window, namespace='metrics')
+    window_start = datetime.fromtimestamp(window * max(app.config['METRICS_CACHE_TTL'], 1), tz=timezone.utc)
+    last_modified = max(last_modified, window_start) if last_modified else window_start
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+    return with_validators(jsonify(get_cached_dashboard_metrics()), etag, last_modified)
+
+
+@app.route('/api/analytics')
+@login_required
+def api_analytics():
+    """Bucketed analytics for an arbitrary date range: ?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=day|week|month"""
+    bucket = request.args.get('bucket', 'month')
+    if bucket not in ANALYTICS_BUCKETS:
+        return jsonify({'error': f"bucket deve ser um de: {', '.join(ANALYTICS_BUCKETS)}"}), 400
+    try:
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else datetime.utcnow().date()
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else _add_months(end, -5)
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+    error = analytics_range_error(start, end, bucket)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    etag, last_modified = data_validators('analytics', start, end, bucket, namespace='metrics')
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+    
+    series = get_analytics(start, end, bucket)
+    quotes_total = sum(row['quotes'] for row in series)
+    approved_total = sum(row['approved_quotes'] for row in series)
+    return with_validators(jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'series': series,
+        'totals': {
+            'orders': sum(row['orders'] for row in series),
+            'revenue': round(sum(row['revenue'] for row in series), 2),
+            'quotes': quotes_total,
+            'approved_quotes': approved_total,
+            'conversion_rate': round(approved_total / quotes_total * 100, 1) if quotes_total else 0
+        }
+    }), etag, last_modified)
+
+
+@app.route('/api/metrics/cache')
+@login_required
+def api_metrics_cache():
+    """Hit/miss counters of the shared metrics cache (all workers)"""
+    return jsonify(dict(shared_cache.stats(), pdf=pdf_cache.stats(), pix=pix_cache_info()))
 
 
 # ==================== INIT ====================
 
 def init_db():
-    """Initialize database with error handling for Railway deployment."""
+    """Initialize database with error handling for Railway deployment.
+    
+    create_all() only creates missing tables; indexes added to existing tables ship as migrations
+    and are applied once per deploy with `flask db upgrade`, not by every worker at boot.
+    """
     try:
         with app.app_context():
             logging.info("Initializing database...")
             db.create_all()
             logging.info("Database tables created successfully.")
             
+            if not DailyOrderStat.query.first() and Order.query.first():
+                rows = rebuild_daily_order_stats()
+                logging.info(f"daily_order_stats backfilled: {rows} rows")
+            
             admin_email = os.environ.get('ADMIN_EMAIL')
             admin_password = os.environ.get('ADMIN_PASSWORD')
             admin_name = os.environ.get('ADMIN_NAME', 'Administrador')
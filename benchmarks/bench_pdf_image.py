@@ -0,0 +1,104 @@
+"""
+Benchmark: PDF de cotação com a imagem de referência original versus a versão "pdf" (JPEG do
+tamanho da caixa em quote_pdf.html a 300 dpi), medindo tempo de renderização e tamanho do PDF.
+
+Usa o QuoteRenderer aquecido de pdf_render.py, como o pool de renderização. Por padrão a imagem
+é uma foto sintética de 4000x3000; passe --image para usar um upload real.
+
+    python benchmarks/bench_pdf_image.py --renders 5 --image static/uploads/quotes/foto.jpg
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from PIL import Image, ImageFilter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_photo(path, size=(4000, 3000)):
+    """Noisy gradient, so JPEG compresses it about as badly as a phone photo"""
+    rnd = random.Random(1)
+    small = Image.new('RGB', (size[0] // 8, size[1] // 8))
+    small.putdata([
+        (x * 255 // small.width, y * 255 // small.height, rnd.randrange(256))
+        for y in range(small.height) for x in range(small.width)
+    ])
+    image = small.resize(size, Image.BICUBIC).filter(ImageFilter.DETAIL)
+    noise = Image.effect_noise(size, 40).convert('RGB')
+    Image.blend(image, noise, 0.25).save(path, 'JPEG', quality=92)
+
+
+def build_html(image_url):
+    from flask import render_template
+    from app import app, Quote, quote_pdf_assets
+
+    quote = Quote(
+        quote_number='ORC-2026-0001', lead_name='Cliente Exemplo', lead_email='cliente@example.com',
+        model='Camiseta Oversized', shirt_color='Preta', print_position='Costas', total_quantity=50,
+        unit_price=Decimal('45.00'), total_price=Decimal('2250.00'), down_payment_percent=40,
+        down_payment_value=Decimal('900.00'), pix_key='11998896725', delivery_days=15,
+        created_at=datetime.utcnow(), valid_until=datetime.utcnow() + timedelta(days=7), items=[],
+    )
+    with app.test_request_context():
+        context, _ = quote_pdf_assets(quote)
+        context['quote_image_url'] = image_url
+        return render_template('quote_pdf.html', quote=quote, stylesheet_preloaded=True, **context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=5)
+    parser.add_argument('--image', help='image to embed (default: synthetic 4000x3000 JPEG)')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('CACHE_PATH', os.path.join(tmp, 'cache.sqlite3'))
+    os.environ.setdefault('TELEMETRY_PATH', os.path.join(tmp, 'telemetry.sqlite3'))
+    from app import PDF_RENDERER_ARGS, pdf_image_variants
+    from images import ImageVariants
+    from pdf_render import QuoteRenderer
+
+    try:
+        os.makedirs(os.path.join(tmp, 'uploads'))
+        original = os.path.join(tmp, 'uploads', 'quote.jpg')
+        if args.image:
+            shutil.copy(args.image, original)
+        else:
+            synthetic_photo(original)
+        variants = ImageVariants(tmp, variants=pdf_image_variants.variants, formats=pdf_image_variants.formats)
+        started = time.perf_counter()
+        derivative = variants.path_for('uploads/quote.jpg', 'pdf', 'jpg')
+        resize_time = time.perf_counter() - started
+
+        with Image.open(original) as a, Image.open(derivative) as b:
+            print(f"original   {a.width}x{a.height}  {os.path.getsize(original) / 1024:8.0f} KB")
+            print(f"derivative {b.width}x{b.height}  {os.path.getsize(derivative) / 1024:8.0f} KB"
+                  f"  (made once at upload, {resize_time * 1000:.0f}ms)")
+
+        renderer = QuoteRenderer(*PDF_RENDERER_ARGS)
+        print(f"{'image':<11} {'median':>9} {'mean':>9} {'PDF size':>10}")
+        for label, path in (('original', original), ('derivative', derivative)):
+            html = build_html(f"file://{path}")
+            times = []
+            for _ in range(args.renders):
+                started = time.perf_counter()
+                pdf = renderer.render(html)
+                times.append(time.perf_counter() - started)
+            times.sort()
+            print(f"{label:<11} {times[len(times) // 2] * 1000:>7.0f}ms {sum(times) / len(times) * 1000:>7.0f}ms "
+                  f"{len(pdf) / 1024:>8.0f}KB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: renderização do PDF de cotação a frio (como era feito na rota) versus com o
+QuoteRenderer aquecido de pdf_render.py.
+
+Cada modo roda em um processo novo, para que o import do WeasyPrint e a configuração de fontes
+entrem na medição do modo frio.
+
+    python benchmarks/bench_pdf_render.py --renders 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build_html():
+    """quote_pdf.html rendered for a sample (unsaved) quote"""
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    from flask import render_template
+    from app import app, Quote, quote_pdf_assets
+
+    quote = Quote(
+        quote_number='ORC-2026-0001', lead_name='Cliente Exemplo', lead_email='cliente@example.com',
+        lead_phone='(11) 90000-0000', model='Camiseta Oversized', shirt_color='Preta',
+        print_position='Costas', print_size='A3', print_color='Branco', total_quantity=50,
+        unit_price=Decimal('45.00'), total_price=Decimal('2250.00'), down_payment_percent=40,
+        down_payment_value=Decimal('900.00'), pix_key='11998896725', delivery_days=15,
+        created_at=datetime.utcnow(), valid_until=datetime.utcnow() + timedelta(days=7), items=[],
+    )
+    with app.test_request_context():
+        context, _ = quote_pdf_assets(quote)
+        html = render_template('quote_pdf.html', quote=quote, stylesheet_preloaded=True, **context)
+    from app import PDF_RENDERER_ARGS
+    return html, PDF_RENDERER_ARGS
+
+
+def run_cold(html, renderer_args, renders):
+    """Previous behaviour: import inside the call, stylesheet inline, nothing reused"""
+    base_url, stylesheet_path, _ = renderer_args
+    with open(stylesheet_path) as f:
+        inline_html = html.replace('</head>', f'<style>{f.read()}</style></head>', 1)
+    times = []
+    for _ in range(renders):
+        started = time.perf_counter()
+        from weasyprint import HTML
+        HTML(string=inline_html, base_url=base_url).write_pdf()
+        times.append(time.perf_counter() - started)
+    return {'setup': 0.0, 'renders': times}
+
+
+def run_warm(html, renderer_args, renders):
+    from pdf_render import QuoteRenderer
+    started = time.perf_counter()
+    renderer = QuoteRenderer(*renderer_args)
+    setup = time.perf_counter() - started
+    times = []
+    for _ in range(renders):
+        started = time.perf_counter()
+        renderer.render(html)
+        times.append(time.perf_counter() - started)
+    return {'setup': setup, 'renders': times}
+
+
+def child(mode, html_path, renders):
+    with open(html_path) as f:
+        payload = json.load(f)
+    runner = run_cold if mode == 'cold' else run_warm
+    print(json.dumps(runner(payload['html'], payload['renderer_args'], renders)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=10)
+    parser.add_argument('--child', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    parser.add_argument('--html', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.html, args.renders)
+        return
+
+    html, renderer_args = build_html()
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({'html': html, 'renderer_args': renderer_args}, f)
+    try:
+        results = {}
+        for mode in ('cold', 'warm'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', mode, '--html', f.name, '--renders', str(args.renders)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+    finally:
+        os.remove(f.name)
+
+    print(f"{'mode':<6} {'setup':>8} {'1st PDF':>9} {'median':>9} {'mean':>9}")
+    for mode, result in results.items():
+        renders = result['renders']
+        steady = sorted(renders[1:] or renders)
+        print(f"{mode:<6} {result['setup'] * 1000:>6.0f}ms {renders[0] * 1000:>7.0f}ms "
+              f"{steady[len(steady) // 2] * 1000:>7.0f}ms {sum(steady) / len(steady) * 1000:>7.0f}ms")
+    cold, warm = results['cold']['renders'], results['warm']['renders']
+    print(f"first PDF after start: {cold[0] * 1000:.0f}ms cold vs {warm[0] * 1000:.0f}ms warm "
+          f"(renderer setup {results['warm']['setup'] * 1000:.0f}ms happens at worker start)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark e verificação do módulo pix.py contra a implementação anterior (copiada abaixo, como
+estava em app.py): os payloads precisam ser idênticos byte a byte.
+
+    python benchmarks/bench_pix.py --payloads 5000 --qrcodes 50
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from io import BytesIO
+
+import qrcode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pix  # noqa: E402
+
+
+def legacy_payload(pix_key, amount=None, name="Emunah", city="Sao Paulo", description=""):
+    def crc16_ccitt(data):
+        crc = 0xFFFF
+        for byte in data.encode('utf-8'):
+            crc ^= byte << 8
+            for _ in range(8):
+                if crc & 0x8000:
+                    crc = (crc << 1) ^ 0x1021
+                else:
+                    crc <<= 1
+                crc &= 0xFFFF
+        return format(crc, '04X')
+
+    def format_emv(id_code, value):
+        return f"{id_code}{len(value):02d}{value}"
+
+    pix_key_clean = ''.join(filter(str.isdigit, pix_key)) if pix_key.replace('+', '').isdigit() else pix_key
+
+    gui = format_emv("00", "BR.GOV.BCB.PIX")
+    chave = format_emv("01", pix_key_clean)
+    if description:
+        desc_clean = description[:25].replace(" ", "")
+        desc_field = format_emv("02", desc_clean)
+        merchant_account = format_emv("26", gui + chave + desc_field)
+    else:
+        merchant_account = format_emv("26", gui + chave)
+
+    payload_format = format_emv("00", "01")
+    merchant_category = format_emv("52", "0000")
+    currency = format_emv("53", "986")
+
+    amount_field = ""
+    if amount and float(amount) > 0:
+        amount_str = f"{float(amount):.2f}"
+        amount_field = format_emv("54", amount_str)
+
+    country = format_emv("58", "BR")
+
+    name_clean = name[:25].upper()
+    for char in ['Á', 'À', 'Ã', 'Â', 'É', 'È', 'Ê', 'Í', 'Ì', 'Î', 'Ó', 'Ò', 'Õ', 'Ô', 'Ú', 'Ù', 'Û', 'Ç']:
+        replacement = {'Á': 'A', 'À': 'A', 'Ã': 'A', 'Â': 'A', 'É': 'E', 'È': 'E', 'Ê': 'E',
+                       'Í': 'I', 'Ì': 'I', 'Î': 'I', 'Ó': 'O', 'Ò': 'O', 'Õ': 'O', 'Ô': 'O',
+                       'Ú': 'U', 'Ù': 'U', 'Û': 'U', 'Ç': 'C'}.get(char, char)
+        name_clean = name_clean.replace(char, replacement)
+    merchant_name = format_emv("59", name_clean)
+
+    city_clean = city[:15].upper()
+    for char in ['Á', 'À', 'Ã', 'Â', 'É', 'È', 'Ê', 'Í', 'Ì', 'Î', 'Ó', 'Ò', 'Õ', 'Ô', 'Ú', 'Ù', 'Û', 'Ç']:
+        replacement = {'Á': 'A', 'À': 'A', 'Ã': 'A', 'Â': 'A', 'É': 'E', 'È': 'E', 'Ê': 'E',
+                       'Í': 'I', 'Ì': 'I', 'Î': 'I', 'Ó': 'O', 'Ò': 'O', 'Õ': 'O', 'Ô': 'O',
+                       'Ú': 'U', 'Ù': 'U', 'Û': 'U', 'Ç': 'C'}.get(char, char)
+        city_clean = city_clean.replace(char, replacement)
+    merchant_city = format_emv("60", city_clean)
+
+    additional_data = format_emv("62", format_emv("05", "***"))
+
+    payload_without_crc = payload_format + merchant_account + merchant_category + currency + amount_field + country + merchant_name + merchant_city + additional_data + "6304"
+    crc = crc16_ccitt(payload_without_crc)
+    return payload_without_crc + crc
+
+
+def legacy_qrcode(pix_key, amount=None, name="Emunah", city="Sao Paulo", description=""):
+    payload = legacy_payload(pix_key, amount, name, city, description)
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="#520B1B", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    buffer.seek(0)
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+
+def sample_entries(count, seed=7):
+    rnd = random.Random(seed)
+    keys = ['11998896725', '+55 11 99889-6725', 'contato@emunah.com.br', '123e4567-e89b-12d3-a456-426614174000']
+    names = ['Emunah', 'Confecção São João', 'Ótica Ímpar', 'Açaí & Cia']
+    cities = ['Sao Paulo', 'São Paulo', 'Ribeirão Preto', 'Maceió']
+    entries = []
+    for i in range(count):
+        amount = rnd.choice([None, 0, Decimal(rnd.randint(1, 999999)) / 100, rnd.uniform(1, 5000)])
+        description = rnd.choice(['', f'ORC{i:05d}', f'PED 2026 {i}', 'Sinal do pedido número muito longo'])
+        entries.append((rnd.choice(keys), amount, rnd.choice(names), rnd.choice(cities), description))
+    return entries
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--payloads', type=int, default=5000)
+    parser.add_argument('--qrcodes', type=int, default=50)
+    args = parser.parse_args()
+
+    entries = sample_entries(args.payloads)
+    expected, legacy_time = timed(lambda: [legacy_payload(*entry) for entry in entries])
+    pix.build_payload.cache_clear()
+    got, cold_time = timed(lambda: [pix.build_payload(*entry) for entry in entries])
+    hot = entries[:1000]  # a working set that fits in the LRU cache
+    for entry in hot:
+        pix.build_payload(*entry)
+    _, warm_time = timed(lambda: [pix.build_payload(*entry) for entry in hot])
+    mismatches = sum(a != b for a, b in zip(expected, got))
+    crc_only = sum(
+        legacy_payload(*entry)[-4:] != pix.crc16_ccitt(legacy_payload(*entry)[:-4]) for entry in entries[:500]
+    )
+
+    same_seller = [('11998896725', entry[1], entry[4]) for entry in entries]
+    _, batch_time = timed(lambda: pix.build_payloads(same_seller))
+
+    qr_entries = entries[:args.qrcodes]
+    legacy_uris, legacy_qr_time = timed(lambda: [legacy_qrcode(*entry) for entry in qr_entries])
+    pix.qr_png.cache_clear()
+    pix.qr_data_uri.cache_clear()
+    uris, cold_qr_time = timed(lambda: [pix.generate_pix_qrcode(*entry) for entry in qr_entries])
+    _, warm_qr_time = timed(lambda: [pix.generate_pix_qrcode(*entry) for entry in qr_entries])
+    qr_mismatches = sum(a != b for a, b in zip(legacy_uris, uris))
+
+    n, q = len(entries), len(qr_entries)
+    print(f"payloads: {n}, mismatches vs legacy: {mismatches}, CRC mismatches: {crc_only}")
+    print(f"  legacy            {legacy_time * 1e6 / n:8.1f} us/payload")
+    print(f"  table CRC (miss)  {cold_time * 1e6 / n:8.1f} us/payload")
+    print(f"  LRU hit           {warm_time * 1e6 / len(hot):8.1f} us/payload")
+    print(f"  batch API         {batch_time * 1e6 / n:8.1f} us/payload")
+    print(f"QR data URIs: {q}, mismatches vs legacy: {qr_mismatches}")
+    print(f"  legacy            {legacy_qr_time * 1e3 / q:8.2f} ms/image")
+    print(f"  pix (miss)        {cold_qr_time * 1e3 / q:8.2f} ms/image")
+    print(f"  pix (LRU hit)     {warm_qr_time * 1e3 / q:8.3f} ms/image")
+    if mismatches or crc_only or qr_mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
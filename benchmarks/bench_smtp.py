@@ -0,0 +1,152 @@
+"""
+Benchmark do envio de emails contra um servidor SMTP local de mentira (sem entrega real).
+
+O servidor aceita EHLO, AUTH PLAIN, MAIL/RCPT/DATA e QUIT e pode atrasar a abertura da sessão e o
+AUTH, simulando o custo de TCP + STARTTLS + login de um provedor real. Compara:
+
+  - legado: connect, login, sendmail e quit para cada mensagem (como era em app.py);
+  - pool: SmtpPool.send por mensagem, reutilizando a sessão autenticada;
+  - lote: SmtpPool.send_many com todas as mensagens numa única sessão.
+
+    python benchmarks/bench_smtp.py --messages 200 --handshake-ms 80
+"""
+import argparse
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smtp_pool import SmtpPool  # noqa: E402
+
+
+class StandInHandler(socketserver.StreamRequestHandler):
+    def send_line(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.handshake_delay)
+        self.send_line('220 stand-in ESMTP')
+        with server.lock:
+            server.sessions += 1
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.send_line('250-stand-in')
+                self.send_line('250 AUTH PLAIN')
+            elif verb == 'HELO':
+                self.send_line('250 stand-in')
+            elif verb == 'AUTH':
+                time.sleep(server.auth_delay)
+                self.send_line('235 2.7.0 Authentication successful')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.send_line('250 OK')
+            elif verb == 'DATA':
+                self.send_line('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self.send_line('250 OK queued')
+            elif verb == 'QUIT':
+                self.send_line('221 Bye')
+                return
+            else:
+                self.send_line('502 Command not implemented')
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handshake_delay, auth_delay):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.handshake_delay = handshake_delay
+        self.auth_delay = auth_delay
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.messages = 0
+
+    def reset(self):
+        with self.lock:
+            self.sessions = self.messages = 0
+
+
+def sample_message(index):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f'Emunah - Pedido #PED-2024-{index:04d} Confirmado'
+    msg['From'] = 'noreply@emunah.com'
+    msg['To'] = f'cliente{index}@example.com'
+    msg.attach(MIMEText('<html><body>' + '<p>Pedido confirmado.</p>' * 40 + '</body></html>', 'html'))
+    return 'noreply@emunah.com', msg['To'], msg.as_string()
+
+
+def send_legacy(host, port, messages):
+    for from_addr, to_addr, msg in messages:
+        server = smtplib.SMTP(host, port)
+        server.login('user', 'secret')
+        server.sendmail(from_addr, to_addr, msg)
+        server.quit()
+
+
+def send_pooled(pool, messages):
+    for from_addr, to_addr, msg in messages:
+        pool.send(from_addr, to_addr, msg)
+
+
+def send_batched(pool, messages):
+    errors = pool.send_many(messages)
+    failed = [error for error in errors if error is not None]
+    if failed:
+        raise failed[0]
+
+
+def run(label, server, fn, count):
+    server.reset()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<8} {count / elapsed:8.1f} msgs/s   {elapsed:7.2f} s   "
+          f"sessions: {server.sessions:4d}   delivered: {server.messages}")
+    return server.messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--handshake-ms', type=float, default=80, help='delay before the greeting (TCP + TLS)')
+    parser.add_argument('--auth-ms', type=float, default=40, help='delay answering AUTH')
+    args = parser.parse_args()
+
+    server = StandInServer(args.handshake_ms / 1000, args.auth_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    messages = [sample_message(i) for i in range(args.messages)]
+    pooled, batched = (SmtpPool(host, port, username='user', password='secret', use_tls=False) for _ in range(2))
+
+    print(f"{args.messages} messages, handshake {args.handshake_ms:.0f} ms, auth {args.auth_ms:.0f} ms")
+    delivered = [
+        run('legado', server, lambda: send_legacy(host, port, messages), args.messages),
+        run('pool', server, lambda: send_pooled(pooled, messages), args.messages),
+        run('lote', server, lambda: send_batched(batched, messages), args.messages),
+    ]
+    print(f"  pool stats: {pooled.stats}, lote stats: {batched.stats}")
+    pooled.close_all()
+    batched.close_all()
+    server.shutdown()
+    if any(count != args.messages for count in delivered):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark de leitura e escrita concorrentes no banco SQLite, com e sem o perfil de produção
+(sqlite_profile.py: WAL, synchronous=NORMAL, busy_timeout, mmap, cache e QueuePool).
+
+Cada processo importa o app como um worker do Gunicorn. Os leitores abrem a lista de orçamentos
+e um pedido; os escritores criam um orçamento com seu pedido, cada um numa transação. Ao fim
+mostra operações por segundo, p95 de latência e quantas operações falharam com
+"database is locked". Cada modo usa um arquivo novo, já que o modo WAL fica gravado no banco.
+
+    python benchmarks/bench_sqlite.py --readers 4 --writers 2 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(tmp, profile):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'emunah.db')}"
+    os.environ['SQLITE_PROFILE'] = 'true' if profile else 'false'
+    os.environ['CACHE_PATH'] = os.path.join(tmp, 'cache.sqlite3')
+    os.environ['TELEMETRY_PATH'] = os.path.join(tmp, 'telemetry.sqlite3')
+    os.environ['EMAIL_OUTBOX_WORKER'] = 'false'
+    sys.path.insert(0, ROOT)
+    import logging
+    logging.disable(logging.WARNING)
+
+
+def setup(tmp, profile, rows):
+    configure(tmp, profile)
+    from app import Order, Quote, Supplier, User, app, db
+    with app.app_context():
+        db.create_all()
+        seller = User(name='Vendedor', email='bench@example.com', role='SELLER')
+        seller.set_password('x')
+        supplier = Supplier(name='Fornecedor')
+        db.session.add_all([seller, supplier])
+        db.session.flush()
+        for i in range(rows):
+            quote = Quote(quote_number=f'SEED-Q-{i}', seller_id=seller.id, status='sent', items=[], total_price=100)
+            db.session.add(quote)
+            db.session.flush()
+            db.session.add(Order(order_number=f'SEED-P-{i}', quote_id=quote.id, supplier_id=supplier.id,
+                                 status='created', total_value=100))
+        db.session.commit()
+
+
+def work(tmp, profile, role, barrier, seconds, results):
+    configure(tmp, profile)
+    from sqlalchemy.exc import OperationalError
+    from app import (QUOTE_LIST_OPTIONS, Order, Quote, app, db, generate_order_number, generate_quote_number,
+                     keyset_page, load_options)
+    with app.app_context():
+        seller_id, supplier_id = 1, 1
+        max_order = db.session.query(db.func.max(Order.id)).scalar()
+    rnd = random.Random(os.getpid())
+
+    def read():
+        keyset_page(Quote.query.options(*load_options(*QUOTE_LIST_OPTIONS)), Quote, '', 50)
+        db.session.get(Order, rnd.randint(1, max_order))
+
+    def write():
+        quote = Quote(quote_number=generate_quote_number(), seller_id=seller_id, status='approved',
+                      items=[], total_price=100)
+        db.session.add(quote)
+        db.session.flush()
+        db.session.add(Order(order_number=generate_order_number(), quote_id=quote.id,
+                             supplier_id=supplier_id, status='created', total_value=100))
+        db.session.commit()
+
+    operation = read if role == 'reader' else write
+    latencies, locked = [], 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        with app.app_context():  # one request
+            try:
+                operation()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+    results.put((role, latencies, locked))
+
+
+def run(label, profile, args):
+    tmp = tempfile.mkdtemp()
+    context = multiprocessing.get_context('spawn')
+    try:
+        process = context.Process(target=setup, args=(tmp, profile, args.rows))
+        process.start()
+        process.join()
+        roles = ['reader'] * args.readers + ['writer'] * args.writers
+        barrier = context.Barrier(len(roles))
+        results = context.Queue()
+        processes = [context.Process(target=work, args=(tmp, profile, role, barrier, args.seconds, results))
+                     for role in roles]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for role in ('reader', 'writer'):
+        latencies = sorted(sum((lat for r, lat, _ in collected if r == role), []))
+        locked = sum(count for r, _, count in collected if r == role)
+        if not latencies:
+            print(f"  {label:<8} {role}s: no successful operations, locked: {locked}")
+            continue
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"  {label:<8} {role}s: {len(latencies) / args.seconds:8.1f} ops/s   "
+              f"p95 {p95 * 1000:7.1f} ms   locked: {locked}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4, help='reader processes')
+    parser.add_argument('--writers', type=int, default=2, help='writer processes')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=2000, help='quotes and orders seeded before the run')
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers + {args.writers} writers, {args.seconds:.0f} s, {args.rows} seeded rows")
+    run('padrão', False, args)
+    run('perfil', True, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Verificação de concorrência da numeração de orçamentos e pedidos (ORC-YYYY-NNNN / PED-YYYY-NNNN).
+
+Vários threads criam orçamentos e pedidos ao mesmo tempo, cada um na sua própria transação, e o
+script confere que nenhum número se repete e que a sequência do ano não tem buracos. Por padrão usa
+um SQLite temporário; passe --database-url para rodar contra um PostgreSQL de teste.
+
+    python benchmarks/check_document_numbers.py --threads 8 --per-thread 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--per-thread', type=int, default=50)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmp, 'numbers.db')}"
+    os.environ.setdefault('CACHE_PATH', os.path.join(tmp, 'cache.sqlite3'))
+    os.environ.setdefault('TELEMETRY_PATH', os.path.join(tmp, 'telemetry.sqlite3'))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import Order, Quote, Supplier, User, app, db, generate_order_number, generate_quote_number
+
+    with app.app_context():
+        db.create_all()
+        seller = User(name='Vendedor', email=f'seller-{time.time_ns()}@example.com', role='SELLER')
+        seller.set_password('x')
+        supplier = Supplier(name='Fornecedor')
+        db.session.add_all([seller, supplier])
+        db.session.commit()
+        seller_id, supplier_id = seller.id, supplier.id
+
+    start = threading.Barrier(args.threads)
+    errors = []
+
+    def create(worker):
+        start.wait()
+        with app.app_context():
+            for _ in range(args.per_thread):
+                try:
+                    quote = Quote(quote_number=generate_quote_number(), seller_id=seller_id,
+                                  status='approved', items=[], total_price=10)
+                    db.session.add(quote)
+                    db.session.flush()
+                    db.session.add(Order(order_number=generate_order_number(), quote_id=quote.id,
+                                         supplier_id=supplier_id, status='created', total_value=10))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(f'thread {worker}: {str(e).splitlines()[0]}')
+            db.session.remove()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        list(executor.map(create, range(args.threads)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        quote_numbers = [number for (number,) in db.session.query(Quote.quote_number)]
+        order_numbers = [number for (number,) in db.session.query(Order.order_number)]
+
+    expected = args.threads * args.per_thread
+    failed = bool(errors)
+    print(f"{args.threads} threads x {args.per_thread}: {expected} quotes + {expected} orders in {elapsed:.2f} s")
+    for label, numbers in (('quotes', quote_numbers), ('orders', order_numbers)):
+        sequence = sorted(int(number.rsplit('-', 1)[1]) for number in numbers)
+        duplicates = len(numbers) - len(set(numbers))
+        gaps = len(sequence) != expected or sequence != list(range(sequence[0], sequence[0] + len(sequence)))
+        print(f"  {label:<7} created: {len(numbers)}  duplicates: {duplicates}  gaps: {'yes' if gaps else 'no'}")
+        failed = failed or duplicates or gaps
+    for error in errors[:10]:
+        print(f"  error: {error}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
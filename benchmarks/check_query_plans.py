@@ -0,0 +1,140 @@
+"""
+Verificação dos planos de execução das consultas do painel e das listagens.
+
+Cria um banco com alguns milhares de orçamentos, pedidos e transações, roda EXPLAIN nas consultas
+quentes (últimos pedidos e orçamentos do painel, listas com filtro de status e cursor, contagem de
+orçamentos por status, exportação por vendedor, entregas no período, transações e itens do pedido)
+e confere que cada uma usa o índice esperado. Por padrão usa um SQLite temporário; com
+--database-url roda contra um PostgreSQL de teste (com enable_seqscan desligado, já que numa
+tabela pequena o planner preferiria ler a tabela inteira).
+
+    python benchmarks/check_query_plans.py --rows 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='quotes and orders to create')
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmp, 'plans.db')}"
+    os.environ.setdefault('CACHE_PATH', os.path.join(tmp, 'cache.sqlite3'))
+    os.environ.setdefault('TELEMETRY_PATH', os.path.join(tmp, 'telemetry.sqlite3'))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import (ORDER_STATUSES, QUOTE_STATUSES, Order, OrderItem, Quote, Supplier, Transaction, User,
+                     app, db)
+
+    with app.app_context():
+        db.create_all()
+        seed(db, args.rows, User, Supplier, Quote, Order, OrderItem, Transaction, QUOTE_STATUSES, ORDER_STATUSES)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('SET enable_seqscan = off'))
+
+        now = datetime.utcnow()
+        cursor = (now - timedelta(days=30), 10 ** 9)
+        seller_id = db.session.query(db.func.min(User.id)).scalar()
+        order_id = db.session.query(db.func.min(Order.id)).scalar()
+        checks = [
+            ('painel: últimos pedidos', 'ix_orders_created_at_id',
+             Order.query.order_by(Order.created_at.desc()).limit(5)),
+            ('painel: últimos orçamentos', 'ix_quotes_created_at_id',
+             Quote.query.order_by(Quote.created_at.desc()).limit(5)),
+            ('painel: orçamentos por status', 'ix_quotes_status_created_at_id',
+             db.session.query(Quote.status, db.func.count(Quote.id)).group_by(Quote.status)),
+            ('lista de orçamentos por status', 'ix_quotes_status_created_at_id',
+             keyset(Quote.query.filter_by(status='sent'), Quote, cursor, db)),
+            ('lista de pedidos por status', 'ix_orders_status_created_at_id',
+             keyset(Order.query.filter_by(status='production'), Order, cursor, db)),
+            ('lista de pedidos (cursor)', 'ix_orders_created_at_id',
+             keyset(Order.query, Order, cursor, db)),
+            ('exportação por vendedor', 'ix_quotes_seller_id',
+             db.session.query(Quote.id).filter(Quote.seller_id == seller_id)),
+            ('entregas no período', 'ix_orders_status_delivered_at',
+             db.session.query(db.func.sum(Order.total_value)).filter(
+                 Order.status == 'delivered', Order.delivered_at >= now - timedelta(days=30))),
+            ('transações do pedido', 'ix_transactions_order_id_status',
+             Transaction.query.filter_by(order_id=order_id)),
+            ('pagamentos confirmados do pedido', 'ix_transactions_order_id_status',
+             db.session.query(db.func.sum(Transaction.amount)).filter_by(order_id=order_id, status='confirmed')),
+            ('itens do pedido', 'ix_order_items_order_id',
+             OrderItem.query.filter_by(order_id=order_id)),
+        ]
+
+        failed = False
+        for label, index, query in checks:
+            plan = explain(db, query.statement)
+            ok = index in plan
+            failed = failed or not ok
+            print(f"  {'ok  ' if ok else 'FAIL'} {label:<34} {index}")
+            if args.verbose or not ok:
+                for line in plan.splitlines():
+                    print(f"         {line}")
+    sys.exit(1 if failed else 0)
+
+
+def keyset(query, model, cursor, db):
+    """The page query keyset_page() runs for a request with ?cursor="""
+    return query.filter(db.tuple_(model.created_at, model.id) < cursor) \
+        .order_by(model.created_at.desc(), model.id.desc()).limit(51)
+
+
+def explain(db, statement):
+    """Plan of a SQLAlchemy statement as text, one node per line"""
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=dialect)
+    params = compiled.params
+    if compiled.positiontup:
+        params = tuple(params[name] for name in compiled.positiontup)
+    connection = db.session.connection()
+    if dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+        return '\n'.join(row[-1] for row in rows)
+    rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', params).all()
+    return '\n'.join(row[0] for row in rows)
+
+
+def seed(db, count, User, Supplier, Quote, Order, OrderItem, Transaction, quote_statuses, order_statuses):
+    rnd = random.Random(7)
+    sellers = [User(name=f'Vendedor {i}', email=f'plans-seller-{i}@example.com', role='SELLER') for i in range(5)]
+    for seller in sellers:
+        seller.set_password('x')
+    supplier = Supplier(name='Fornecedor')
+    db.session.add_all(sellers + [supplier])
+    db.session.flush()
+
+    now = datetime.utcnow()
+    quotes, orders = [], []
+    for i in range(count):
+        created = now - timedelta(minutes=rnd.randrange(365 * 24 * 60))
+        quotes.append(Quote(quote_number=f'PLAN-Q-{i}', seller_id=rnd.choice(sellers).id, items=[],
+                            status=rnd.choice(quote_statuses), total_price=100, created_at=created))
+    db.session.add_all(quotes)
+    db.session.flush()
+    for i, quote in enumerate(quotes):
+        status = rnd.choice(order_statuses)
+        orders.append(Order(order_number=f'PLAN-P-{i}', quote_id=quote.id, supplier_id=supplier.id,
+                            status=status, total_value=100, created_at=quote.created_at,
+                            delivered_at=quote.created_at + timedelta(days=10) if status == 'delivered' else None))
+    db.session.add_all(orders)
+    db.session.flush()
+    for order in orders:
+        db.session.add(OrderItem(order_id=order.id, description='Camiseta', quantity=10))
+        for _ in range(rnd.randrange(3)):
+            db.session.add(Transaction(order_id=order.id, payment_method='pix', amount=50,
+                                       status=rnd.choice(('pending', 'confirmed'))))
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
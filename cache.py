@@ -0,0 +1,173 @@
+"""
+Cache compartilhado entre os workers do Gunicorn, armazenado em um arquivo SQLite local.
+
+Cada entrada guarda a versão do namespace no momento em que foi gravada. Rotas de escrita
+chamam bump() depois do commit; leitores descartam entradas de versões antigas ou expiradas.
+Os contadores de acertos e falhas ficam na memória de cada processo e são somados ao arquivo
+de tempos em tempos, para que uma leitura do cache não vire uma escrita no arquivo.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class SharedCache:
+    """Key/value cache with TTL and per-namespace version counters, shared through one SQLite file"""
+
+    def __init__(self, path, default_ttl=60, counter_flush_interval=30):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.counter_flush_interval = counter_flush_interval
+        self._local = threading.local()
+        self._counts = {}
+        self._counts_pid = os.getpid()
+        self._counts_lock = threading.Lock()
+        self._counts_flushed_at = time.monotonic()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                namespace TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                changed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name):
+        with self._counts_lock:
+            if self._counts_pid != os.getpid():
+                # Forked worker: the parent's pending counts are the parent's to flush
+                self._counts, self._counts_pid = {}, os.getpid()
+                self._counts_flushed_at = time.monotonic()
+            self._counts[name] = self._counts.get(name, 0) + 1
+            due = time.monotonic() - self._counts_flushed_at >= self.counter_flush_interval
+        if due:
+            self.flush_counters()
+
+    def flush_counters(self):
+        """Add this process's pending hit/miss counts to the shared file, in one write transaction"""
+        with self._counts_lock:
+            counts, self._counts = self._counts, {}
+            self._counts_flushed_at = time.monotonic()
+        if not counts:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute('BEGIN')
+                conn.executemany(
+                    'INSERT INTO cache_counters (name, value) VALUES (?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                    list(counts.items())
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache counter flush failed ({self.path}): {e}")
+            with self._counts_lock:
+                for name, value in counts.items():
+                    self._counts[name] = self._counts.get(name, 0) + value
+
+    def version(self, namespace='default'):
+        return self.version_info(namespace)[0]
+
+    def version_info(self, namespace='default'):
+        """Return (version, changed_at) for the namespace; changed_at is a Unix timestamp or None"""
+        row = self._connect().execute(
+            'SELECT version, changed_at FROM cache_versions WHERE namespace = ?', (namespace,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+
+    def bump(self, namespace='default'):
+        """Invalidate every entry of the namespace, in all workers"""
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO cache_versions (namespace, version, changed_at) VALUES (?, 1, ?) '
+            'ON CONFLICT(namespace) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at',
+            (namespace, time.time())
+        )
+        return self.version(namespace)
+
+    def get(self, key, namespace='default', version=None):
+        """Return the cached value, or None when missing, expired or from an older version"""
+        conn = self._connect()
+        if version is None:
+            version = self.version(namespace)
+        row = conn.execute(
+            'SELECT value, version, expires_at FROM cache_entries WHERE key = ?',
+            (f'{namespace}:{key}',)
+        ).fetchone()
+        if row and row[1] == version and row[2] > time.time():
+            self._count('hits')
+            return json.loads(row[0])
+        self._count('misses')
+        return None
+
+    def set(self, key, value, namespace='default', version=None, ttl=None):
+        conn = self._connect()
+        if version is None:
+            version = self.version(namespace)
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, version, expires_at) VALUES (?, ?, ?, ?)',
+            (f'{namespace}:{key}', json.dumps(value), version, expires_at)
+        )
+
+    def get_or_set(self, key, factory, namespace='default', ttl=None):
+        """Return the cached value or compute it with factory() and store it.
+
+        The version is read before computing, so a bump() that lands while factory() runs
+        leaves the new entry already stale instead of hiding the write.
+        """
+        try:
+            version = self.version(namespace)
+            value = self.get(key, namespace, version)
+            if value is not None:
+                return value
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache unavailable ({self.path}): {e}")
+            return factory()
+        value = factory()
+        try:
+            self.set(key, value, namespace, version, ttl)
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache write failed ({self.path}): {e}")
+        return value
+
+    def stats(self):
+        """Counters of all workers, as of their last flush (this process's pending ones included)"""
+        self.flush_counters()
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, value FROM cache_counters').fetchall())
+        versions = dict(conn.execute('SELECT namespace, version FROM cache_versions').fetchall())
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total * 100, 1) if total else 0,
+            'versions': versions,
+            'entries': conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0],
+        }
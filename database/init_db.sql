@@ -101,6 +101,7 @@ CREATE TABLE IF NOT EXISTS prints (
 
 CREATE INDEX IF NOT EXISTS idx_prints_name ON prints(name);
 CREATE INDEX IF NOT EXISTS idx_prints_active ON prints(active);
+CREATE INDEX IF NOT EXISTS ix_prints_file_url ON prints(file_url);
 
 -- =====================================================
 -- TABELA: quotes (Cotações/Orçamentos)
@@ -164,8 +165,11 @@ CREATE TABLE IF NOT EXISTS quotes (
 CREATE INDEX IF NOT EXISTS idx_quotes_quote_number ON quotes(quote_number);
 CREATE INDEX IF NOT EXISTS idx_quotes_status ON quotes(status);
 CREATE INDEX IF NOT EXISTS idx_quotes_client_id ON quotes(client_id);
-CREATE INDEX IF NOT EXISTS idx_quotes_seller_id ON quotes(seller_id);
+CREATE INDEX IF NOT EXISTS ix_quotes_seller_id ON quotes(seller_id);
 CREATE INDEX IF NOT EXISTS idx_quotes_created_at ON quotes(created_at);
+CREATE INDEX IF NOT EXISTS ix_quotes_image_path ON quotes(image_path);
+CREATE INDEX IF NOT EXISTS ix_quotes_created_at_id ON quotes(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_quotes_status_created_at_id ON quotes(status, created_at, id);
 
 -- =====================================================
 -- TABELA: orders (Pedidos)
@@ -213,6 +217,30 @@ CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_orders_client_id ON orders(client_id);
 CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_orders_status_created_at_id ON orders(status, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_orders_status_delivered_at ON orders(status, delivered_at);
+
+-- =====================================================
+-- TABELA: daily_order_stats (Resumo diário de pedidos)
+-- Mantida pela aplicação; reconstrua com: flask rebuild-order-stats
+-- =====================================================
+CREATE TABLE IF NOT EXISTS daily_order_stats (
+    day DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    
+    -- Pedidos criados no dia que estão atualmente neste status
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    total_value NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    paid_value NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    pending_value NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    
+    -- Pedidos entregues no dia (apenas status 'delivered')
+    delivered_count INTEGER NOT NULL DEFAULT 0,
+    delivered_revenue NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (day, status)
+);
 
 -- =====================================================
 -- TABELA: order_items (Itens do Pedido)
@@ -232,7 +260,7 @@ CREATE TABLE IF NOT EXISTS order_items (
     customization JSONB
 );
 
-CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items(order_id);
 
 -- =====================================================
 -- TABELA: transactions (Transações/Pagamentos)
@@ -247,7 +275,7 @@ CREATE TABLE IF NOT EXISTS transactions (
     notes TEXT
 );
 
-CREATE INDEX IF NOT EXISTS idx_transactions_order_id ON transactions(order_id);
+CREATE INDEX IF NOT EXISTS ix_transactions_order_id_status ON transactions(order_id, status);
 CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions(status);
 
 -- =====================================================
@@ -266,6 +294,83 @@ CREATE TABLE IF NOT EXISTS email_logs (
 CREATE INDEX IF NOT EXISTS idx_email_logs_recipient ON email_logs(recipient);
 CREATE INDEX IF NOT EXISTS idx_email_logs_created_at ON email_logs(created_at);
 
+-- =====================================================
+-- TABELA: email_outbox (Fila de emails a enviar)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id SERIAL PRIMARY KEY,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(500),
+    html_body TEXT NOT NULL,
+    email_type VARCHAR(50),
+    attachment_name VARCHAR(255),
+    attachment BYTEA,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    locked_by VARCHAR(100),
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_status_next_attempt ON email_outbox(status, next_attempt_at);
+
+-- =====================================================
+-- TABELA: upload_blobs (Uploads endereçados pelo conteúdo)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS upload_blobs (
+    path VARCHAR(500) PRIMARY KEY,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    size INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- TABELA: document_counters (Numeração ORC-/PED- por ano)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS document_counters (
+    prefix VARCHAR(10) NOT NULL,
+    year INTEGER NOT NULL,
+    last_value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (prefix, year)
+);
+
+-- =====================================================
+-- TABELA: pdf_jobs (Geração de PDFs em segundo plano)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS pdf_jobs (
+    id SERIAL PRIMARY KEY,
+    quote_id INTEGER NOT NULL REFERENCES quotes(id) ON DELETE CASCADE,
+    cache_key VARCHAR(64) NOT NULL,
+    action VARCHAR(20) NOT NULL DEFAULT 'download',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    error_message TEXT,
+    worker_pid INTEGER,
+    requested_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_pdf_jobs_cache_key ON pdf_jobs(cache_key);
+
+-- =====================================================
+-- TABELA: export_jobs (Exportações de cotações em ZIP)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id SERIAL PRIMARY KEY,
+    quote_ids JSON NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    error_message TEXT,
+    worker_pid INTEGER,
+    requested_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
 -- =====================================================
 -- COMENTÁRIOS NAS TABELAS
 -- =====================================================
@@ -279,6 +384,12 @@ COMMENT ON TABLE orders IS 'Pedidos confirmados (convertidos de cotações)';
 COMMENT ON TABLE order_items IS 'Itens individuais de cada pedido';
 COMMENT ON TABLE transactions IS 'Transações financeiras (pagamentos)';
 COMMENT ON TABLE email_logs IS 'Log de emails enviados pelo sistema';
+COMMENT ON TABLE email_outbox IS 'Fila de emails entregues em segundo plano (resultado final em email_logs)';
+COMMENT ON TABLE upload_blobs IS 'Quantos orçamentos/estampas usam cada imagem enviada (arquivo nomeado pelo SHA-256)';
+COMMENT ON TABLE document_counters IS 'Último número emitido por prefixo (ORC, PED) e ano';
+COMMENT ON TABLE pdf_jobs IS 'Fila de geração de PDFs de cotações fora das requisições';
+COMMENT ON TABLE export_jobs IS 'Exportações de cotações em ZIP geradas em segundo plano (arquivo em instance/exports)';
+COMMENT ON TABLE daily_order_stats IS 'Resumo diário de pedidos e faturamento (usado pelo dashboard)';
 
 -- =====================================================
 -- FIM DO SCRIPT
@@ -19,6 +19,7 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from flask_migrate import upgrade
 from app import app, db, User, Client, Supplier, Product, Print
 
 
@@ -30,7 +31,8 @@ def init_database():
         print("EMUNAH - Inicialização do Banco de Dados")
         print("=" * 60)
         
-        print("\n[1/4] Criando tabelas do banco de dados...")
+        print("\n[1/4] Aplicando migrações e criando tabelas do banco de dados...")
+        upgrade(directory=os.path.join(app.root_path, 'migrations'))
         db.create_all()
         print("      Tabelas criadas com sucesso!")
         
@@ -0,0 +1,18 @@
+"""
+Hooks do Gunicorn (lido automaticamente de ./gunicorn.conf.py; as demais opções continuam
+na linha de comando do Procfile/Dockerfile).
+"""
+import os
+
+
+def post_worker_init(worker):
+    """Start the PDF render pool with each worker, so the first quote PDF finds a warm renderer,
+    the email sender thread, so mail queued before a restart goes out without waiting for new mail,
+    and the PDF job sweeper, which re-dispatches jobs left running by a worker that died"""
+    if os.environ.get('PDF_RENDER_WARMUP', 'true').lower() == 'true':
+        from app import render_pool
+        render_pool.start()
+    from app import app, email_worker, pdf_job_sweeper
+    if app.config['EMAIL_OUTBOX_WORKER']:
+        email_worker.start()
+    pdf_job_sweeper.start()
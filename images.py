@@ -0,0 +1,150 @@
+"""
+Variantes redimensionadas das imagens enviadas (estampas e orçamentos).
+
+Cada upload ganha, ao lado do original, versões "thumb" e "medium" em WebP e JPEG, com o nome
+do original seguido de @variante (quote_1_ab12cd34@thumb.webp). Os templates montam o srcset
+com as variantes que existem, pela largura real de cada arquivo (thumbnail() nunca amplia, então
+uma imagem pequena gera variantes menores que a caixa), e caem no original quando ainda não há
+nenhuma; o comando
+build-image-variants gera as que faltam para arquivos antigos.
+
+Imagens de orçamento também ganham uma versão JPEG "pdf", do tamanho da caixa da imagem em
+quote_pdf.html a 300 dpi, para o WeasyPrint não decodificar e embutir a foto original.
+"""
+import functools
+import logging
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+# (name, longest side in pixels, or a (width, height) box)
+VARIANTS = (('thumb', 320), ('medium', 960))
+# (extension, Pillow format, save options)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def variant_path(rel_path, variant, ext):
+    """Path of a variant, next to the original: uploads/prints/x.png -> uploads/prints/x@thumb.webp"""
+    return f"{rel_path.rsplit('.', 1)[0]}@{variant}.{ext}"
+
+
+def is_variant(filename):
+    return '@' in os.path.basename(filename)
+
+
+def _flatten(image):
+    """RGB copy for JPEG: transparent pixels become white instead of black"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+@functools.lru_cache(maxsize=4096)
+def _image_width(path, mtime_ns):
+    """Pixel width of an image file; Pillow only reads the header. Keyed by mtime so rewrites are seen."""
+    try:
+        with Image.open(path) as image:
+            return image.width
+    except OSError:
+        return None
+
+
+class ImageVariants:
+    """Creates, finds and deletes the resized variants of files under a static root"""
+
+    def __init__(self, static_root, variants=VARIANTS, formats=FORMATS):
+        self.static_root = static_root
+        self.variants = variants
+        self.formats = formats
+
+    def _abs(self, rel_path):
+        return os.path.join(self.static_root, rel_path)
+
+    def _save(self, image, rel_path, pil_format, options):
+        path = self._abs(rel_path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, pil_format, **options)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; these are public static files
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def generate(self, rel_path, force=False):
+        """Write the missing variants of one upload (all of them with force). Returns how many were written."""
+        wanted = [
+            (name, size, ext, pil_format, options)
+            for name, size in self.variants
+            for ext, pil_format, options in self.formats
+            if force or not os.path.exists(self._abs(variant_path(rel_path, name, ext)))
+        ]
+        if not wanted:
+            return 0
+        with Image.open(self._abs(rel_path)) as original:
+            original.seek(0)  # first frame of animated GIF/WebP
+            source = ImageOps.exif_transpose(original)
+            source.load()
+        for name, size, ext, pil_format, options in wanted:
+            image = source.copy()
+            image.thumbnail(size if isinstance(size, tuple) else (size, size), Image.LANCZOS)
+            if pil_format == 'JPEG':
+                image = _flatten(image)
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            self._save(image, variant_path(rel_path, name, ext), pil_format, options)
+        return len(wanted)
+
+    def generate_quietly(self, rel_path):
+        """generate() for upload handlers: a broken image must not fail the upload"""
+        try:
+            return self.generate(rel_path)
+        except Exception as e:
+            logging.warning(f"Could not create image variants for {rel_path}: {e}")
+            return 0
+
+    def path_for(self, rel_path, variant, ext):
+        """Absolute path of a variant, creating it on first use; None if it cannot be made"""
+        path = self._abs(variant_path(rel_path, variant, ext))
+        if not os.path.exists(path):
+            self.generate_quietly(rel_path)
+        return path if os.path.exists(path) else None
+
+    def width(self, rel_path):
+        """Actual pixel width of a file under the static root, or None if it is missing or unreadable"""
+        path = self._abs(rel_path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        return _image_width(path, mtime_ns)
+
+    def srcset(self, rel_path, ext):
+        """(rel_path, width) of each existing variant in one format, smallest first.
+
+        Widths are read from the files. A variant no wider than the previous one (the original
+        was already smaller than its box) adds nothing to the srcset and is left out.
+        """
+        entries = []
+        for name, _ in self.variants:
+            path = variant_path(rel_path, name, ext)
+            width = self.width(path)
+            if width and (not entries or width > entries[-1][1]):
+                entries.append((path, width))
+        return entries
+
+    def delete(self, rel_path):
+        for name, _ in self.variants:
+            for ext, _, _ in self.formats:
+                path = self._abs(variant_path(rel_path, name, ext))
+                if os.path.exists(path):
+                    os.remove(path)
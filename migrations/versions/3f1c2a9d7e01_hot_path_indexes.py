@@ -0,0 +1,79 @@
+"""Indexes for the hot query paths (lists, dashboard, seller filter, transactions)
+
+Also the first revision: it brings databases made by db.create_all() up to every index the
+models declare, including those added before there were migrations (keyset pagination, email
+outbox, PDF jobs, upload paths), since create_all() never adds indexes to existing tables.
+Existing indexes are skipped, so it also runs cleanly where init_db.sql or an earlier boot
+already created some. On PostgreSQL the indexes are built CONCURRENTLY, so the tables stay
+writable while they are created. Downgrading drops only the hot-path indexes introduced here.
+
+Revision ID: 3f1c2a9d7e01
+Revises:
+Create Date: 2026-10-17 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns)
+# Model indexes from before this revision: created where missing, never dropped
+SCHEMA_INDEXES = (
+    ('ix_quotes_created_at_id', 'quotes', ['created_at', 'id']),
+    ('ix_quotes_status_created_at_id', 'quotes', ['status', 'created_at', 'id']),
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id']),
+    ('ix_orders_status_created_at_id', 'orders', ['status', 'created_at', 'id']),
+    ('ix_quotes_image_path', 'quotes', ['image_path']),
+    ('ix_prints_file_url', 'prints', ['file_url']),
+    ('ix_email_outbox_status_next_attempt', 'email_outbox', ['status', 'next_attempt_at']),
+    ('ix_pdf_jobs_cache_key', 'pdf_jobs', ['cache_key']),
+)
+# Hot-path indexes introduced by this revision
+INDEXES = (
+    ('ix_quotes_seller_id', 'quotes', ['seller_id']),
+    ('ix_orders_status_delivered_at', 'orders', ['status', 'delivered_at']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_transactions_order_id_status', 'transactions', ['order_id', 'status']),
+)
+
+
+def _existing_indexes(indexes):
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    return {
+        (table, index['name'])
+        for table in {table for _, table, _ in indexes} & tables
+        for index in inspector.get_indexes(table)
+    }, tables
+
+
+def upgrade():
+    indexes = SCHEMA_INDEXES + INDEXES
+    existing, tables = _existing_indexes(indexes)
+    missing = [
+        (name, table, columns) for name, table, columns in indexes
+        if table in tables and (table, name) not in existing
+    ]
+    if not missing:
+        return
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in missing:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in missing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    existing, _ = _existing_indexes(INDEXES)
+    for name, table, _ in reversed(INDEXES):
+        if (table, name) in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,60 @@
+"""
+Envio de emails em segundo plano.
+
+As rotas só gravam a mensagem na tabela email_outbox; um thread por gunicorn worker esvazia a
+fila, acordado na hora por quem enfileira ou, no pior caso, a cada intervalo de polling. Este
+módulo não conhece o app: recebe a função que processa um lote e a executa em loop.
+"""
+import logging
+import os
+import threading
+
+
+class OutboxWorker:
+    """Daemon thread that runs `drain` right away, whenever woken, and every `interval` seconds.
+
+    `drain` returns True when it filled a whole batch, so the loop runs again without waiting.
+    The thread is started lazily and restarted after a fork, like RenderPool.
+    """
+
+    def __init__(self, drain, interval=10, name='email-outbox'):
+        self.drain = drain
+        self.interval = interval
+        self.name = name
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def wake(self):
+        """Ask the thread to look at the outbox now"""
+        self.start()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                more = self.drain()
+            except Exception:
+                logging.exception(f"{self.name}: drain failed")
+                more = False
+            if not more:
+                self._wakeup.wait(self.interval)
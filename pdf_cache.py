@@ -0,0 +1,104 @@
+"""
+Cache em disco dos PDFs de orçamento já renderizados.
+
+A chave é um hash de tudo o que entra na renderização (HTML do template e os arquivos de imagem
+referenciados), então editar um orçamento gera uma chave nova sem nenhuma invalidação explícita.
+Entradas antigas saem por tamanho total, das menos usadas recentemente para as mais usadas.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+
+class PdfCache:
+    """Content-addressed PDF files in one directory, evicted by total size in LRU order"""
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(html, file_paths=()):
+        """Hash the rendered HTML plus the identity (path, size, mtime) of each referenced file"""
+        digest = hashlib.sha256(html.encode('utf-8'))
+        for path in file_paths:
+            digest.update(b'\0' + path.encode('utf-8'))
+            try:
+                stat = os.stat(path)
+                digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+            except OSError:
+                digest.update(b'missing')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def has(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Return the cached PDF bytes, or None; a hit refreshes the entry's LRU position"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temp file and rename, so a concurrent reader never sees a partial PDF
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits in max_bytes"""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            if not name.endswith('.pdf'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError as e:
+                logging.warning(f"Could not evict cached PDF {path}: {e}")
+        return removed
+
+    def stats(self):
+        sizes = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.pdf'):
+                    try:
+                        sizes.append(os.path.getsize(os.path.join(self.directory, name)))
+                    except OSError:
+                        pass
+        return {'entries': len(sizes), 'bytes': sum(sizes), 'max_bytes': self.max_bytes}
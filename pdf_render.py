@@ -0,0 +1,176 @@
+"""
+Renderização de PDFs fora das requisições.
+
+Os gunicorn workers enviam o HTML já montado de quote_pdf.html para um pool limitado de
+processos; o processo filho roda o WeasyPrint e grava o resultado no cache de PDFs. Este
+módulo não importa o app, para que os processos do pool subam leves (contexto "spawn").
+
+Cada processo do pool cria um QuoteRenderer uma única vez: WeasyPrint importado, fontes
+configuradas, a folha de estilo compartilhada já interpretada e o logo já decodificado. Cada
+renderização faz apenas o layout do conteúdo da cotação.
+"""
+import fcntl
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pdf_cache import PdfCache
+
+SPAWN = multiprocessing.get_context('spawn')
+
+_renderer = None
+
+
+class QuoteRenderer:
+    """WeasyPrint prepared once per process: fonts, the shared stylesheet and static images"""
+
+    def __init__(self, base_url, stylesheet_path, static_files=()):
+        from weasyprint import CSS, HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        self._html_class = HTML
+        self.base_url = base_url
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(filename=stylesheet_path, font_config=self.font_config)
+        # WeasyPrint's image cache, keyed by URL; holds only the static images decoded below
+        self.image_cache = {}
+        self._warm_up(static_files)
+
+    def _warm_up(self, static_files):
+        """Lay out one small page so fonts, stylesheet and static images are loaded before the first quote"""
+        images = ''.join(
+            f'<img src="file://{path}">' for path in static_files if os.path.exists(path)
+        )
+        html = f'<html><body><div class="container"><h1>Emunah</h1><p>Orçamento</p>{images}</div></body></html>'
+        self._write(html, self.image_cache)
+
+    def _write(self, html, cache):
+        return self._html_class(string=html, base_url=self.base_url).write_pdf(
+            stylesheets=[self.stylesheet], font_config=self.font_config, cache=cache
+        )
+
+    def render(self, html):
+        # Copy so per-quote images (uploads) do not accumulate in the long-lived cache
+        return self._write(html, dict(self.image_cache))
+
+
+def init_renderer(base_url, stylesheet_path, static_files=()):
+    """Pool initializer: build this process's renderer"""
+    global _renderer
+    _renderer = QuoteRenderer(base_url, stylesheet_path, static_files)
+
+
+def render_to_cache(html, cache_dir, max_bytes, key):
+    """Runs inside a pool process: render the HTML and store it under key. Returns (key, seconds, size)."""
+    started = time.perf_counter()
+    pdf_data = _renderer.render(html)
+    elapsed = time.perf_counter() - started
+    PdfCache(cache_dir, max_bytes).put(key, pdf_data)
+    return key, elapsed, len(pdf_data)
+
+
+def _warm():
+    return os.getpid()
+
+
+class RenderPool:
+    """Lazily started, bounded process pool; one per gunicorn worker"""
+
+    def __init__(self, processes, renderer_args):
+        self.processes = processes
+        self.renderer_args = renderer_args
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn instead of fork: the parent has DB connections and threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=SPAWN,
+                    initializer=init_renderer,
+                    initargs=self.renderer_args,
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def start(self):
+        """Start every pool process now, so renderers are warm before the first request"""
+        executor = self.executor()
+        for _ in range(self.processes):
+            executor.submit(_warm)
+
+    def submit(self, fn, *args):
+        return self.executor().submit(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def render_unordered(tasks, cache_dir, max_bytes, pool, window=None):
+    """Render (tag, key, html) tasks on a RenderPool, yielding (tag, key, error) as each one finishes.
+
+    Tasks are pulled lazily and at most `window` are in flight, so memory does not grow
+    with the size of the batch, and other users of the same pool are not queued behind all of it.
+    """
+    window = window or pool.processes * 2
+    tasks = iter(tasks)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            try:
+                tag, key, html = next(tasks)
+            except StopIteration:
+                exhausted = True
+                break
+            try:
+                future = pool.submit(render_to_cache, html, cache_dir, max_bytes, key)
+            except Exception as e:  # broken or shut down pool
+                yield tag, key, e
+                continue
+            pending[future] = (tag, key)
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            tag, key = pending.pop(future)
+            error = future.exception()
+            yield tag, key, error
+
+
+class HostSlots:
+    """At most `count` holders at a time across all processes of the host (flock on slot files).
+
+    A slot is freed by release() or, if its process dies, by the kernel.
+    """
+
+    def __init__(self, directory, count):
+        self.directory = directory
+        self.count = count
+
+    def acquire(self):
+        """Return a held slot (a file descriptor), or None when all are taken"""
+        os.makedirs(self.directory, exist_ok=True)
+        for index in range(self.count):
+            fd = os.open(os.path.join(self.directory, f'slot-{index}.lock'), os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def release(self, fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        except OSError:
+            pass  # already released
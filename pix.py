@@ -0,0 +1,191 @@
+"""
+Geração do payload PIX (BR Code estático) e do QR Code correspondente.
+
+O CRC16-CCITT usa uma tabela pré-calculada, a transliteração de acentos é um mapa fixo e os
+resultados ficam em caches LRU por (chave, valor, descrição): o mesmo orçamento gera o payload
+e o PNG uma única vez por processo.
+
+PixImageStore grava PNG/SVG em disco sob o hash do payload, para a rota /pix/<hash>.<ext>
+servir arquivos imutáveis.
+"""
+import base64
+import hashlib
+import os
+import re
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+from qrcode.image.svg import SvgPathFillImage
+
+QR_FILL_COLOR = "#520B1B"
+QR_BACK_COLOR = "white"
+
+_TRANSLITERATION = str.maketrans({
+    'Á': 'A', 'À': 'A', 'Ã': 'A', 'Â': 'A', 'É': 'E', 'È': 'E', 'Ê': 'E',
+    'Í': 'I', 'Ì': 'I', 'Î': 'I', 'Ó': 'O', 'Ò': 'O', 'Õ': 'O', 'Ô': 'O',
+    'Ú': 'U', 'Ù': 'U', 'Û': 'U', 'Ç': 'C',
+})
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16_ccitt(data):
+    """CRC16-CCITT (poly 0x1021, init 0xFFFF) of the UTF-8 bytes, as 4 uppercase hex digits"""
+    crc = 0xFFFF
+    table = _CRC16_TABLE
+    for byte in data.encode('utf-8'):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return format(crc, '04X')
+
+
+def format_emv(id_code, value):
+    return f"{id_code}{len(value):02d}{value}"
+
+
+@lru_cache(maxsize=2048)
+def build_payload(pix_key, amount=None, name="Emunah", city="Sao Paulo", description=""):
+    """PIX copy-and-paste payload for the key, optional amount and description"""
+    pix_key_clean = ''.join(filter(str.isdigit, pix_key)) if pix_key.replace('+', '').isdigit() else pix_key
+
+    gui = format_emv("00", "BR.GOV.BCB.PIX")
+    chave = format_emv("01", pix_key_clean)
+    if description:
+        desc_field = format_emv("02", description[:25].replace(" ", ""))
+        merchant_account = format_emv("26", gui + chave + desc_field)
+    else:
+        merchant_account = format_emv("26", gui + chave)
+
+    amount_field = ""
+    if amount and float(amount) > 0:
+        amount_field = format_emv("54", f"{float(amount):.2f}")
+
+    payload_without_crc = (
+        format_emv("00", "01")
+        + merchant_account
+        + format_emv("52", "0000")
+        + format_emv("53", "986")
+        + amount_field
+        + format_emv("58", "BR")
+        + format_emv("59", name[:25].upper().translate(_TRANSLITERATION))
+        + format_emv("60", city[:15].upper().translate(_TRANSLITERATION))
+        + format_emv("62", format_emv("05", "***"))
+        + "6304"
+    )
+    return payload_without_crc + crc16_ccitt(payload_without_crc)
+
+
+def build_payloads(entries, name="Emunah", city="Sao Paulo"):
+    """Payloads for many charges at once.
+
+    `entries` yields (pix_key, amount, description) tuples; repeated entries are built once.
+    """
+    return [build_payload(pix_key, amount, name, city, description or "")
+            for pix_key, amount, description in entries]
+
+
+@lru_cache(maxsize=512)
+def qr_png(payload):
+    """PNG bytes of the QR Code for a payload"""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color=QR_FILL_COLOR, back_color=QR_BACK_COLOR)
+
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class _BrandSvgImage(SvgPathFillImage):
+    QR_PATH_STYLE = dict(SvgPathFillImage.QR_PATH_STYLE, fill=QR_FILL_COLOR)
+    background = QR_BACK_COLOR
+
+
+@lru_cache(maxsize=512)
+def qr_svg(payload):
+    """SVG bytes of the QR Code for a payload"""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4,
+                       image_factory=_BrandSvgImage)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.make_image().to_string(encoding='unicode').encode('utf-8')
+
+
+@lru_cache(maxsize=512)
+def qr_data_uri(payload):
+    return f"data:image/png;base64,{base64.b64encode(qr_png(payload)).decode('utf-8')}"
+
+
+def generate_pix_qrcode(pix_key, amount=None, name="Emunah", city="Sao Paulo", description=""):
+    """Generate PIX QR Code as base64 string"""
+    return qr_data_uri(build_payload(pix_key, amount, name, city, description))
+
+
+def payload_hash(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class PixImageStore:
+    """QR images on disk, named by payload hash; generated once, then served as immutable files"""
+
+    RENDERERS = {'png': qr_png, 'svg': qr_svg}
+    HASH_RE = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, digest, ext):
+        return os.path.join(self.directory, f'{digest}.{ext}')
+
+    def _write(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def register(self, payload):
+        """Remember the payload behind its hash (cheap; images are generated on first request)"""
+        digest = payload_hash(payload)
+        path = self._path(digest, 'txt')
+        if not os.path.exists(path):
+            self._write(path, payload.encode('utf-8'))
+        return digest
+
+    def image_path(self, digest, ext):
+        """Path of the image file, generating it if needed; None for unknown hashes"""
+        if ext not in self.RENDERERS or not self.HASH_RE.match(digest):
+            return None
+        path = self._path(digest, ext)
+        if os.path.exists(path):
+            return path
+        try:
+            with open(self._path(digest, 'txt'), encoding='utf-8') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        self._write(path, self.RENDERERS[ext](payload))
+        return path
+
+
+def cache_info():
+    return {
+        'payloads': build_payload.cache_info()._asdict(),
+        'png': qr_png.cache_info()._asdict(),
+        'svg': qr_svg.cache_info()._asdict(),
+        'data_uri': qr_data_uri.cache_info()._asdict(),
+    }
@@ -0,0 +1,156 @@
+"""
+Pool de sessões SMTP autenticadas.
+
+Cada conexão nova custa TCP, STARTTLS e AUTH antes do primeiro email. O pool guarda as sessões
+já autenticadas do processo e as reutiliza, fecha as que ficaram ociosas por mais de
+idle_timeout e reconecta quando o servidor derruba uma sessão no meio do envio. send_many
+passa um lote inteiro por uma única sessão.
+"""
+import os
+import smtplib
+import threading
+import time
+
+
+def _close(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+def is_connection_error(error):
+    """True when the session is unusable (the message itself was not rejected)"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    # SMTPException subclasses OSError; only plain socket errors count here
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SmtpPool:
+    """Authenticated SMTP sessions kept open for reuse; one pool per process"""
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 max_idle=2, idle_timeout=60, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []  # (session, monotonic time it was returned)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self.stats = {'connects': 0, 'reuses': 0, 'reconnects': 0}
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            _close(server)
+            raise
+        self.stats['connects'] += 1
+        return server
+
+    def _checkout(self):
+        now = time.monotonic()
+        expired = []
+        server = None
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sessions inherited through fork share their socket with the parent
+                self._idle = []
+                self._pid = os.getpid()
+            while self._idle:
+                candidate, returned_at = self._idle.pop()
+                if now - returned_at <= self.idle_timeout:
+                    server = candidate
+                    break
+                expired.append(candidate)
+        for candidate in expired:
+            _close(candidate)
+        if server is not None:
+            self.stats['reuses'] += 1
+            return server
+        return self._connect()
+
+    def _checkin(self, server):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append((server, time.monotonic()))
+                return
+        _close(server)
+
+    def prune(self):
+        """Close sessions idle for longer than idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [server for server, returned_at in self._idle if now - returned_at > self.idle_timeout]
+            self._idle = [(server, returned_at) for server, returned_at in self._idle
+                          if now - returned_at <= self.idle_timeout]
+        for server in expired:
+            _close(server)
+        return len(expired)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close(server)
+
+    def send_many(self, messages, on_result=None):
+        """Send (from_addr, to_addrs, msg) tuples through one session; returns an error or None per message.
+
+        A message whose session drops is retried once on a fresh connection and the batch goes on.
+        If no session can be opened at all, the rest of the batch fails with that error.
+        on_result(index, error, seconds) runs as soon as each message's outcome is known, before the
+        next one is sent, so the caller can record it; an exception it raises stops the batch.
+        """
+        messages = list(messages)
+        results = []
+        server = None
+        try:
+            for index, (from_addr, to_addrs, msg) in enumerate(messages):
+                started = time.perf_counter()
+                error = None
+                for attempt in (1, 2):
+                    try:
+                        if server is None:
+                            server = self._checkout()
+                    except Exception as e:
+                        for rest in range(index, len(messages)):
+                            results.append(e)
+                            if on_result is not None:
+                                on_result(rest, e, time.perf_counter() - started if rest == index else 0.0)
+                        return results
+                    try:
+                        server.sendmail(from_addr, to_addrs, msg)
+                    except Exception as e:
+                        if is_connection_error(e):
+                            _close(server)
+                            server = None
+                            if attempt == 1:
+                                self.stats['reconnects'] += 1
+                                continue
+                        error = e
+                    break
+                results.append(error)
+                if on_result is not None:
+                    on_result(index, error, time.perf_counter() - started)
+        finally:
+            if server is not None:
+                self._checkin(server)
+        return results
+
+    def send(self, from_addr, to_addrs, msg):
+        error = self.send_many([(from_addr, to_addrs, msg)])[0]
+        if error is not None:
+            raise error
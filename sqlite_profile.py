@@ -0,0 +1,63 @@
+"""
+Perfil de produção do SQLite para o banco principal (instalações pequenas em um único servidor).
+
+Com o journal padrão (DELETE), quem escreve bloqueia quem lê e vice-versa: com vários workers do
+Gunicorn aparecem esperas longas e "database is locked". Em WAL os leitores continuam lendo a
+última versão confirmada enquanto um único escritor grava, e synchronous=NORMAL só sincroniza
+o disco nos checkpoints. Os PRAGMAs de conexão (busy_timeout, mmap_size, cache_size) são
+aplicados a cada conexão nova; o pool mantém poucas conexões abertas por processo, para que
+o cache de páginas e o mmap sejam reaproveitados entre requisições.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory(uri):
+    url = make_url(uri)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+def engine_options(uri, pool_size=5, busy_timeout_ms=5000):
+    """SQLALCHEMY_ENGINE_OPTIONS for a SQLite URI.
+
+    File databases get a small QueuePool: the writer is single anyway, and every connection kept
+    open keeps its page cache. pool_pre_ping/pool_recycle are left out - a local file does not
+    drop idle connections. In-memory databases keep SQLAlchemy's default pool, which is what
+    keeps the one database alive.
+    """
+    if is_memory(uri):
+        return {}
+    return {
+        'poolclass': QueuePool,
+        'pool_size': pool_size,
+        'max_overflow': pool_size,
+        'pool_timeout': busy_timeout_ms / 1000,
+        'connect_args': {'timeout': busy_timeout_ms / 1000},
+    }
+
+
+def install_pragmas(engine, busy_timeout_ms=5000, mmap_size=256 * 1024 * 1024, cache_size_kb=16 * 1024):
+    """Apply the profile's PRAGMAs to every new connection of `engine`"""
+    pragmas = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={int(busy_timeout_ms)}',
+        f'PRAGMA mmap_size={int(mmap_size)}',
+        f'PRAGMA cache_size=-{int(cache_size_kb)}',  # negative: KiB instead of pages
+    )
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return apply_pragmas
@@ -20,9 +20,12 @@ def init_database():
     print("Inicializando banco de dados...")
     
     try:
+        from flask_migrate import upgrade
         from app import app, db, User
         
         with app.app_context():
+            upgrade(directory=os.path.join(app.root_path, 'migrations'))
+            print("Migrações aplicadas!")
             db.create_all()
             print("Tabelas criadas!")
             
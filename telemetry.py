@@ -0,0 +1,215 @@
+"""
+Métricas no formato Prometheus agregadas entre os workers do Gunicorn.
+
+Cada worker acumula contadores e histogramas em memória e, a cada poucos segundos, soma os
+incrementos em um arquivo SQLite local compartilhado. Gauges são gravados por PID e somados
+apenas entre os workers que reportaram recentemente. Uma coleta em /metrics lê o arquivo e
+devolve os números da instância inteira.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return ','.join(parts)
+
+
+class Telemetry:
+    """Counters, gauges and histograms shared by all worker processes through one SQLite file"""
+
+    def __init__(self, path, flush_interval=5, gauge_max_age=300):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.gauge_max_age = gauge_max_age
+        self._families = {}
+        self._pending = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_flush = time.monotonic()
+        atexit.register(self._flush_quietly)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS telemetry_samples (
+                family TEXT NOT NULL,
+                name TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (name, labels)
+            );
+            CREATE TABLE IF NOT EXISTS telemetry_gauges (
+                pid INTEGER NOT NULL,
+                family TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                value REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (pid, family, labels)
+            );
+        """)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    # ---------- declaration ----------
+
+    def counter(self, name, help_text):
+        self._families[name] = ('counter', help_text, None)
+
+    def gauge(self, name, help_text):
+        self._families[name] = ('gauge', help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._families[name] = ('histogram', help_text, tuple(sorted(buckets)) + (float('inf'),))
+
+    # ---------- recording ----------
+
+    def _add(self, family, name, labels, amount):
+        key = (family, name, _format_labels(labels))
+        self._pending[key] = self._pending.get(key, 0) + amount
+
+    def inc(self, name, labels=None, amount=1):
+        with self._lock:
+            self._add(name, name, labels, amount)
+
+    def observe(self, name, value, labels=None):
+        buckets = self._families[name][2]
+        labels = dict(labels or {})
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._add(name, f'{name}_bucket', dict(labels, le=_format_value(bound)), 1)
+            self._add(name, f'{name}_sum', labels, value)
+            self._add(name, f'{name}_count', labels, 1)
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[(name, _format_labels(labels))] = value
+
+    def timer(self, name, labels=None):
+        """Context manager observing the elapsed seconds into a histogram"""
+        return _Timer(self, name, labels)
+
+    # ---------- persistence ----------
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            gauges = dict(self._gauges)
+            self._last_flush = time.monotonic()
+        if not pending and not gauges:
+            return
+        conn = self._connect()
+        now = time.time()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO telemetry_samples (family, name, labels, value) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value',
+                [(family, name, labels, amount) for (family, name, labels), amount in pending.items()]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO telemetry_gauges (pid, family, labels, value, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(os.getpid(), name, labels, value, now) for (name, labels), value in gauges.items()]
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # Keep the increments for the next attempt instead of losing them
+            with self._lock:
+                for key, amount in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + amount
+            raise
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logging.warning(f"Telemetry flush failed: {e}")
+
+    # ---------- exposition ----------
+
+    def render(self):
+        """Prometheus text exposition of the whole instance"""
+        self.flush()
+        conn = self._connect()
+        cutoff = time.time() - self.gauge_max_age
+        conn.execute('DELETE FROM telemetry_gauges WHERE updated_at < ?', (cutoff,))
+        samples = {}
+        for family, name, labels, value in conn.execute(
+            'SELECT family, name, labels, value FROM telemetry_samples'
+        ):
+            samples.setdefault(family, []).append((name, labels, value))
+        for family, labels, value in conn.execute(
+            'SELECT family, labels, SUM(value) FROM telemetry_gauges GROUP BY family, labels'
+        ):
+            samples.setdefault(family, []).append((family, labels, value))
+
+        lines = []
+        for family in sorted(samples):
+            kind, help_text, _ = self._families.get(family, ('untyped', '', None))
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            for name, labels, value in sorted(samples[family], key=_sample_order):
+                lines.append(f'{name}{{{labels}}} {_format_value(value)}' if labels else f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _sample_order(sample):
+    name, labels, _ = sample
+    le = None
+    other = []
+    for part in labels.split(',') if labels else []:
+        if part.startswith('le="'):
+            le = part[4:-1]
+        else:
+            other.append(part)
+    le_value = float('inf') if le == '+Inf' else float(le) if le else 0
+    return (','.join(other), name, le_value)
+
+
+class _Timer:
+    def __init__(self, telemetry, name, labels):
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe(self.name, time.perf_counter() - self.started, self.labels)
+        return False
@@ -0,0 +1,60 @@
+"""
+Armazenamento de uploads endereçado pelo conteúdo.
+
+O arquivo é gravado sob o SHA-256 do seu conteúdo, calculado enquanto o upload é copiado para o
+disco: a mesma arte enviada para dez orçamentos ocupa um único arquivo, e a URL muda sempre que
+o conteúdo muda, o que permite cache imutável. Quem usa cada arquivo é contado na tabela
+upload_blobs (ver app.py); o arquivo só é apagado quando a contagem chega a zero.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+# uploads/<folder>/<sha256>.<ext>, or one of its variants (<sha256>@thumb.webp)
+CONTENT_ADDRESSED_RE = re.compile(r'^uploads/[a-z]+/[0-9a-f]{64}(@[a-z]+)?\.[a-z0-9]+$')
+
+
+def is_content_addressed(rel_path):
+    return bool(CONTENT_ADDRESSED_RE.match(rel_path))
+
+
+def hash_to_temp(stream, directory):
+    """Copy a file-like object to a temp file in `directory`, hashing it on the way. Returns (tmp_path, sha256, size)."""
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; uploads are public static files
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def publish(tmp_path, path):
+    """Make the content of tmp_path available at path, unless an identical file is already there"""
+    if os.path.exists(path):
+        # Refresh the mtime, so the orphan sweep's grace period covers this new reference too
+        os.utime(path)
+        return
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    except OSError:
+        # Filesystems without hard links: copy, then rename into place
+        fd, copy_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(tmp_path, copy_path)
+        os.chmod(copy_path, 0o644)
+        os.replace(copy_path, path)
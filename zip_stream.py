@@ -0,0 +1,45 @@
+"""
+ZIP escrito em pedaços, para ser enviado enquanto é montado.
+
+O zipfile aceita destinos sem seek (usa data descriptors); aqui o destino só acumula os bytes
+escritos desde a última leitura, e quem gera a resposta drena o buffer a cada arquivo.
+"""
+import zipfile
+
+
+class _Sink:
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    """Add files one by one and collect the bytes produced so far with drain()"""
+
+    def __init__(self, compression=zipfile.ZIP_STORED):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, mode='w', compression=compression)
+
+    def add(self, name, data):
+        self._zip.writestr(name, data)
+        return self._sink.drain()
+
+    def close(self):
+        self._zip.close()
+        return self._sink.drain()